@@ -63,6 +63,7 @@ export const useWebSocket = (conversationId) => {
             ...lastMessage,
             id: data.message_id,
             content: data.text,
+            truncated: data.truncated,
             finalized: true
           }
         }
@@ -70,6 +71,24 @@ export const useWebSocket = (conversationId) => {
       })
     })
 
+    // User messages sent from another tab or device
+    websocketService.onMessage('chat_message', (data) => {
+      setMessages(prev => [
+        ...prev,
+        {
+          id: data.message_id,
+          sender: data.sender,
+          content: data.content,
+          timestamp: data.timestamp
+        }
+      ])
+    })
+
+    // The server is replaying the reply from the start
+    websocketService.onMessage('resume_reset', () => {
+      setMessages(prev => prev.filter(msg => msg.sender !== 'ai' || msg.finalized !== false))
+    })
+
     websocketService.onMessage('typing_indicator', (data) => {
       if (data.user_id !== 'current-user') {
         setIsTyping(data.is_typing)
@@ -99,11 +118,16 @@ export const useWebSocket = (conversationId) => {
     websocketService.sendMessage('typing_indicator', { is_typing: isTyping })
   }
 
+  const stopGeneration = () => {
+    websocketService.sendMessage('stop_generation', {})
+  }
+
   return {
     messages,
     sendMessage,
     isConnected,
     isTyping,
-    sendTypingIndicator
+    sendTypingIndicator,
+    stopGeneration
   }
 }
\ No newline at end of file
@@ -4,6 +4,8 @@ class WebSocketService {
     this.messageHandlers = new Map()
     this.reconnectAttempts = 0
     this.maxReconnectAttempts = 5
+    // Reply being streamed: { message_id, last_seq }
+    this.pendingReply = null
   }
 
   connect(conversationId) {
@@ -19,6 +21,10 @@ class WebSocketService {
     this.socket.onopen = () => {
       console.log('WebSocket connected')
       this.reconnectAttempts = 0
+      // Pick up tokens missed while disconnected instead of re-sending
+      if (this.pendingReply) {
+        this.sendMessage('resume', this.pendingReply)
+      }
     }
 
     this.socket.onmessage = (event) => {
@@ -64,6 +70,21 @@ class WebSocketService {
   }
 
   handleMessage(data) {
+    if (data.type === 'llm_token') {
+      const pending = this.pendingReply
+      if (pending?.message_id === data.message_id && data.seq <= pending.last_seq) {
+        return
+      }
+      this.pendingReply = { message_id: data.message_id, last_seq: data.seq }
+    } else if (data.type === 'llm_done' || data.type === 'resume_failed') {
+      this.pendingReply = null
+    } else if (data.type === 'resume_reset') {
+      this.pendingReply = { message_id: data.message_id, last_seq: 0 }
+    } else if (data.type === 'stream_active' && !this.pendingReply) {
+      this.pendingReply = { message_id: data.message_id, last_seq: 0 }
+      this.sendMessage('resume', this.pendingReply)
+    }
+
     const handler = this.messageHandlers.get(data.type)
     if (handler) {
       handler(data)
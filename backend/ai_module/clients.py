@@ -0,0 +1,60 @@
+"""
+Provider clients shared within a process.
+
+Building an AsyncOpenAI client loads a TLS trust store (tens of
+milliseconds of CPU on the event loop) and each one keeps its own
+connection pool, so services take the client for the running loop from
+here rather than creating their own. The SDK itself takes about half a
+second to import; it is imported on first use, which the ASGI server does
+while preloading (see core.lifespan), so processes that never call the
+provider (migrations, beat) skip it.
+
+Synchronous callers (Celery tasks, management commands) go through run(),
+which drives their coroutines on one long-lived loop per process instead of
+a fresh asyncio.run() loop per call, so they share a single client too.
+"""
+import os
+import asyncio
+import threading
+from django.conf import settings
+
+_clients = {}
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def import_sdk():
+    from openai import AsyncOpenAI
+    return AsyncOpenAI
+
+
+def openai_client():
+    """Shared AsyncOpenAI client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        # Forget the clients of loops that have since closed, e.g. a
+        # caller's own asyncio.run()
+        for stale in [other for other in _clients if other.is_closed()]:
+            del _clients[stale]
+        client = _clients[loop] = import_sdk()(
+            api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL
+        )
+    return client
+
+
+def _background_loop():
+    global _loop, _loop_pid
+    with _loop_lock:
+        # A forked child inherits the loop object but not its thread
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name='ai-client-loop', daemon=True).start()
+        return _loop
+
+
+def run(coro):
+    """Run a coroutine to completion from synchronous code on the process's shared loop"""
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
@@ -0,0 +1,120 @@
+import math
+from typing import List, Optional, Sequence
+from django.conf import settings
+from django.db.models import Value
+from pgvector.django import (
+    BitField, HalfVector, HalfVectorField, HammingDistance, HnswIndex,
+    L2Distance, VectorField,
+)
+
+PRECISION_FLOAT32 = 'float32'
+PRECISION_FLOAT16 = 'float16'
+PRECISIONS = (PRECISION_FLOAT32, PRECISION_FLOAT16)
+
+# Models that were trained with Matryoshka representation learning and accept
+# the `dimensions` request parameter
+MATRYOSHKA_MODELS = ('text-embedding-3-small', 'text-embedding-3-large')
+
+
+def embedding_dimensions() -> int:
+    return settings.EMBEDDING_DIMENSIONS
+
+
+def embedding_field(**kwargs):
+    """Model field for a stored embedding in the configured precision"""
+    if settings.EMBEDDING_PRECISION == PRECISION_FLOAT16:
+        return HalfVectorField(dimensions=embedding_dimensions(), **kwargs)
+    return VectorField(dimensions=embedding_dimensions(), **kwargs)
+
+
+def embedding_bits_field(**kwargs):
+    """Model field for the sign-quantized copy of an embedding"""
+    return BitField(length=embedding_dimensions(), **kwargs)
+
+
+def embedding_index(name: str, field: str = 'embedding') -> HnswIndex:
+    """HNSW index using the operator class matching the configured precision"""
+    opclass = 'halfvec_l2_ops' if settings.EMBEDDING_PRECISION == PRECISION_FLOAT16 else 'vector_l2_ops'
+    return HnswIndex(name=name, fields=[field], opclasses=[opclass], m=16, ef_construction=64)
+
+
+def embedding_bits_index(name: str, field: str = 'embedding_bits') -> HnswIndex:
+    return HnswIndex(name=name, fields=[field], opclasses=['bit_hamming_ops'], m=16, ef_construction=64)
+
+
+def embedding_indexes(prefix: str) -> List[HnswIndex]:
+    """
+    The one HNSW index searches use: on the bit copy with binary
+    quantization (full vectors are only re-ranked by primary key), on the
+    full vectors otherwise
+    """
+    if binary_enabled():
+        return [embedding_bits_index(f'{prefix}_bits_hnsw')]
+    return [embedding_index(f'{prefix}_embedding_hnsw')]
+
+
+def truncate(embedding: Sequence[float], dimensions: int) -> List[float]:
+    """Matryoshka truncation: keep the leading dimensions and re-normalize"""
+    head = list(embedding[:dimensions])
+    norm = math.sqrt(sum(x * x for x in head))
+    if norm == 0:
+        return head
+    return [x / norm for x in head]
+
+
+def fit_dimensions(embedding: Sequence[float]) -> List[float]:
+    """Bring a provider embedding to the configured storage dimensions"""
+    dimensions = embedding_dimensions()
+    if len(embedding) > dimensions:
+        return truncate(embedding, dimensions)
+    return list(embedding)
+
+
+def quantize_binary(embedding: Sequence[float]) -> str:
+    """Sign-quantize an embedding into a bit string for a BitField"""
+    return ''.join('1' if x > 0 else '0' for x in embedding)
+
+
+def binary_enabled() -> bool:
+    return settings.EMBEDDING_BINARY_QUANTIZATION
+
+
+def storage_values(embedding: Optional[Sequence[float]]) -> dict:
+    """Field values to assign on a model storing `embedding` (None clears it)"""
+    values = {'embedding': embedding}
+    if binary_enabled():
+        values['embedding_bits'] = quantize_binary(embedding) if embedding is not None else None
+    return values
+
+
+def storage_fields() -> List[str]:
+    """Names of the fields written by `storage_values`, for bulk updates"""
+    return ['embedding', 'embedding_bits'] if binary_enabled() else ['embedding']
+
+
+def query_vector(embedding: Sequence[float]):
+    """Wrap a query embedding so it is sent with the stored precision"""
+    if settings.EMBEDDING_PRECISION == PRECISION_FLOAT16:
+        return HalfVector(embedding)
+    return embedding
+
+
+def nearest(queryset, embedding: Sequence[float], limit: int, field: str = 'embedding'):
+    """
+    Order `queryset` by L2 distance to `embedding`, annotated as `similarity`.
+    With binary quantization enabled, candidates are first shortlisted by
+    Hamming distance on the bit index and then re-ranked on the full vectors.
+    """
+    distance = L2Distance(field, query_vector(embedding))
+    if not binary_enabled():
+        return list(queryset.annotate(similarity=distance).order_by('similarity')[:limit])
+
+    candidates = limit * settings.EMBEDDING_RERANK_CANDIDATES
+    shortlist = queryset.annotate(
+        hamming=HammingDistance(f'{field}_bits', Value(quantize_binary(embedding)))
+    ).order_by('hamming').values('pk')[:candidates]
+    return list(
+        queryset.filter(pk__in=shortlist)
+        .annotate(similarity=distance)
+        .order_by('similarity')[:limit]
+    )
@@ -0,0 +1,216 @@
+"""
+CPU-only conversation analysis: lexicon sentiment and extractive key points.
+
+Nothing here calls a provider or touches the database, so it can run in
+batch over every message of a conversation (or of many conversations)
+inside the analysis task.
+"""
+import re
+from typing import Dict, List, Sequence
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z']+")
+SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?]*")
+
+# Valence lexicon in the spirit of VADER, on a -4..4 scale
+LEXICON = {
+    'good': 1.9, 'great': 3.1, 'excellent': 3.2, 'amazing': 2.8, 'awesome': 3.1,
+    'love': 3.2, 'like': 1.5, 'nice': 1.8, 'happy': 2.7, 'glad': 2.0,
+    'thanks': 1.9, 'thank': 1.5, 'helpful': 2.0, 'perfect': 2.7, 'works': 1.0,
+    'working': 0.8, 'fixed': 1.4, 'solved': 1.7, 'success': 2.7, 'successful': 2.6,
+    'easy': 1.9, 'fast': 1.0, 'clear': 1.4, 'useful': 1.9, 'agree': 1.5,
+    'correct': 1.4, 'fine': 0.8, 'better': 1.9, 'best': 3.2, 'improved': 2.1,
+    'wonderful': 2.7, 'fantastic': 2.6, 'pleased': 1.9, 'appreciate': 2.0, 'cool': 1.3,
+    'interesting': 1.7, 'exciting': 2.2, 'excited': 1.4, 'recommend': 1.5, 'yes': 1.0,
+    'bad': -2.5, 'terrible': -2.1, 'awful': -2.0, 'horrible': -2.5, 'hate': -2.7,
+    'wrong': -2.1, 'error': -1.7, 'errors': -1.6, 'fail': -2.5, 'failed': -2.3,
+    'failing': -2.3, 'failure': -2.3, 'broken': -2.1, 'bug': -1.5, 'bugs': -1.5,
+    'crash': -2.0, 'crashes': -2.0, 'problem': -1.7, 'problems': -1.7, 'issue': -1.0,
+    'issues': -1.0, 'slow': -1.2, 'confusing': -1.3, 'confused': -1.3, 'difficult': -1.5,
+    'hard': -0.4, 'annoying': -1.7, 'frustrated': -2.0, 'frustrating': -2.2, 'sad': -2.1,
+    'angry': -2.3, 'worse': -2.1, 'worst': -3.1, 'useless': -1.8, 'disappointed': -2.3,
+    'disappointing': -2.2, 'unfortunately': -1.5, 'sorry': -0.3, 'stuck': -1.0, 'no': -1.2,
+    'unable': -1.5, 'cannot': -0.8, 'poor': -2.1, 'ugly': -2.3, 'stupid': -2.4,
+}
+
+NEGATORS = frozenset({
+    'not', 'no', 'never', "don't", "doesn't", "didn't", "isn't", "wasn't",
+    "aren't", "won't", "can't", "couldn't", "shouldn't", 'without', 'nothing',
+})
+
+INTENSIFIERS = {
+    'very': 0.293, 'really': 0.293, 'extremely': 0.293, 'so': 0.293, 'super': 0.293,
+    'totally': 0.293, 'quite': 0.2, 'slightly': -0.293, 'somewhat': -0.293, 'barely': -0.293,
+}
+
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before
+being below between both but by can could did do does doing down during each few
+for from further had has have having he her here hers him his how i if in into is
+it its itself just me more most my no nor not now of off on once only or other our
+out over own same she should so some such than that the their them then there these
+they this those through to too under until up very was we were what when where which
+while who whom why will with would you your yours i'm it's that's we'll i'll you're
+ok okay yes yeah hi hello thanks thank please also get got like
+""".split())
+
+KEY_POINT_CUES = [
+    ('decision', re.compile(r"\b(decided|decide|agreed|agree to|we'll go with|going with|chose|settled on|approved)\b", re.I)),
+    ('action', re.compile(r"\b(will|todo|to-do|need to|needs to|must|should|action item|assign(ed)?|take care of)\b", re.I)),
+    ('follow_up', re.compile(r"\b(follow[- ]?up|next (week|time|step)|later|revisit|check back|remind)\b", re.I)),
+]
+
+CUE_BOOST = 0.25
+NEGATION_SCALAR = -0.74
+NORMALIZATION_ALPHA = 15.0
+NEUTRAL_THRESHOLD = 0.05
+
+_VOCAB = {word: i for i, word in enumerate(LEXICON)}
+_VALENCE = np.array(list(LEXICON.values()), dtype=np.float64)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def sentiment_label(score: float) -> str:
+    if score > NEUTRAL_THRESHOLD:
+        return 'positive'
+    if score < -NEUTRAL_THRESHOLD:
+        return 'negative'
+    return 'neutral'
+
+
+class LocalAnalyzer:
+    def __init__(self, max_sentences: int = 1000, max_terms: int = 2000, damping: float = 0.85):
+        self.max_sentences = max_sentences
+        self.max_terms = max_terms
+        self.damping = damping
+
+    def message_sentiment(self, texts: Sequence[str]) -> np.ndarray:
+        """Compound sentiment in [-1, 1] for each text"""
+        owner, valence, negated, boost = [], [], [], []
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            for j, token in enumerate(tokens):
+                index = _VOCAB.get(token)
+                if index is None:
+                    continue
+                window = tokens[max(j - 3, 0):j]
+                owner.append(i)
+                valence.append(index)
+                negated.append(any(word in NEGATORS for word in window))
+                boost.append(INTENSIFIERS.get(tokens[j - 1], 0.0) if j else 0.0)
+        if not owner:
+            return np.zeros(len(texts))
+
+        weights = _VALENCE[np.asarray(valence)]
+        weights = weights + np.sign(weights) * np.asarray(boost)
+        weights = np.where(np.asarray(negated), weights * NEGATION_SCALAR, weights)
+        totals = np.bincount(np.asarray(owner), weights=weights, minlength=len(texts))
+        return totals / np.sqrt(totals * totals + NORMALIZATION_ALPHA)
+
+    def conversation_sentiment(self, scores: np.ndarray) -> Dict:
+        """Aggregate message scores into the conversation sentiment record"""
+        if not len(scores):
+            return {'score': 0.5, 'label': 'neutral', 'confidence': 0.0,
+                    'messages': {'positive': 0, 'neutral': 0, 'negative': 0}}
+        # Only messages carrying sentiment contribute to the mean
+        charged = scores[np.abs(scores) > NEUTRAL_THRESHOLD]
+        compound = float(charged.mean()) if len(charged) else 0.0
+        label = sentiment_label(compound)
+        labels = np.where(scores > NEUTRAL_THRESHOLD, 1, np.where(scores < -NEUTRAL_THRESHOLD, -1, 0))
+        direction = {'positive': 1, 'neutral': 0, 'negative': -1}[label]
+        return {
+            'score': round((compound + 1) / 2, 4),
+            'label': label,
+            'confidence': round(float((labels == direction).mean()), 4),
+            'messages': {
+                'positive': int((labels == 1).sum()),
+                'neutral': int((labels == 0).sum()),
+                'negative': int((labels == -1).sum()),
+            }
+        }
+
+    def split_sentences(self, texts: Sequence[str]):
+        """(owner index, sentence) pairs for sentences worth ranking"""
+        sentences = []
+        for i, text in enumerate(texts):
+            for match in SENTENCE_RE.finditer(text):
+                sentence = match.group().strip()
+                if len(tokenize(sentence)) >= 4:
+                    sentences.append((i, sentence))
+        return sentences
+
+    def _tfidf(self, sentences: Sequence[str]) -> np.ndarray:
+        docs = [[t for t in tokenize(s) if t not in STOPWORDS] for s in sentences]
+        df = {}
+        for doc in docs:
+            for term in set(doc):
+                df[term] = df.get(term, 0) + 1
+        terms = sorted(df, key=df.get, reverse=True)[:self.max_terms]
+        vocab = {term: i for i, term in enumerate(terms)}
+
+        rows, cols = [], []
+        for r, doc in enumerate(docs):
+            for term in doc:
+                c = vocab.get(term)
+                if c is not None:
+                    rows.append(r)
+                    cols.append(c)
+        matrix = np.zeros((len(docs), len(vocab)), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), 1.0)
+        idf = np.log((1 + len(docs)) / (1 + np.array([df[t] for t in terms], dtype=np.float32))) + 1
+        matrix = np.log1p(matrix) * idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def _textrank(self, matrix: np.ndarray, iterations: int = 30) -> np.ndarray:
+        similarity = matrix @ matrix.T
+        np.fill_diagonal(similarity, 0)
+        degree = similarity.sum(axis=1, keepdims=True)
+        transition = similarity / np.where(degree == 0, 1, degree)
+        n = len(matrix)
+        rank = np.full(n, 1.0 / n, dtype=np.float32)
+        for _ in range(iterations):
+            updated = (1 - self.damping) / n + self.damping * (transition.T @ rank)
+            if np.abs(updated - rank).sum() < 1e-6:
+                return updated
+            rank = updated
+        return rank
+
+    def key_points(self, texts: Sequence[str], limit: int = 8):
+        """
+        Extractive key points as (owner index, sentence, score, type), in
+        conversation order, together with the per-text salience.
+        """
+        salience = np.zeros(len(texts))
+        sentences = self.split_sentences(texts)
+        if not sentences:
+            return [], salience
+
+        matrix = self._tfidf([s for _, s in sentences])
+        if len(sentences) > self.max_sentences:
+            # Pre-select by TF-IDF mass so the similarity matrix stays bounded
+            keep = np.sort(np.argsort(-matrix.sum(axis=1))[:self.max_sentences])
+            sentences = [sentences[i] for i in keep]
+            matrix = matrix[keep]
+
+        # Centrality alone is flat for short conversations, so sentences that
+        # read like decisions, actions or follow-ups get a fixed boost
+        kinds = [
+            next((name for name, cue in KEY_POINT_CUES if cue.search(sentence)), 'topic')
+            for _, sentence in sentences
+        ]
+        scores = self._textrank(matrix)
+        scores = scores / scores.max() + CUE_BOOST * np.array([kind != 'topic' for kind in kinds])
+        scores = scores / scores.max()
+        owners = np.array([owner for owner, _ in sentences])
+        np.maximum.at(salience, owners, scores)
+
+        chosen = np.sort(np.argsort(-scores)[:limit])
+        points = []
+        for i in chosen:
+            owner, sentence = sentences[i]
+            points.append((int(owner), sentence, round(float(scores[i]), 4), kinds[i]))
+        return points, salience
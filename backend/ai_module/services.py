@@ -1,18 +1,39 @@
 import os
+import time
 import asyncio
-from typing import AsyncGenerator, List, Dict, Any
-from openai import AsyncOpenAI
+from typing import AsyncGenerator, List, Dict, Any, Optional
 from django.conf import settings
+from django.db import transaction
+from core import metrics
 from chat.models import Conversation, Message
+from . import embeddings as embedding_storage
+from .clients import openai_client, run
+from .summarization import RollingSummarizer, format_messages
+from .tokens import pack_to_budget
+from .local_analysis import LocalAnalyzer, sentiment_label
 
 class AIService:
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = settings.AI_MODEL
         self.embedding_model = settings.EMBEDDING_MODEL
+        self.embedding_dimensions = settings.EMBEDDING_DIMENSIONS
+    
+    @property
+    def client(self):
+        return openai_client()
+    
+    def _embedding_options(self) -> Dict[str, Any]:
+        # Let Matryoshka models return truncated vectors server-side
+        if self.embedding_model in embedding_storage.MATRYOSHKA_MODELS:
+            return {'dimensions': self.embedding_dimensions}
+        return {}
     
     async def stream_chat_completion(self, messages: List[Dict], **kwargs) -> AsyncGenerator[str, None]:
         """Stream chat completion from OpenAI"""
+        stream = None
+        started = time.perf_counter()
+        first_token_at = None
+        tokens = 0
         try:
             stream = await self.client.chat.completions.create(
                 model=self.model,
@@ -24,96 +45,143 @@ class AIService:
             
             async for chunk in stream:
                 if chunk.choices[0].delta.content is not None:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        metrics.LLM_TTFT_SECONDS.labels(self.model).observe(first_token_at - started)
+                    tokens += 1
                     yield chunk.choices[0].delta.content
                     
         except Exception as e:
+            metrics.LLM_ERRORS.labels(self.model, 'chat_stream', type(e).__name__).inc()
             yield f"Error: {str(e)}"
+        finally:
+            # Releasing the response aborts generation upstream when the
+            # caller stops iterating early
+            if stream is not None:
+                await stream.response.aclose()
+            # Recorded here rather than in a span: a span made current
+            # inside this generator would leak into the caller between yields
+            finished = time.perf_counter()
+            metrics.LLM_REQUEST_SECONDS.labels(self.model, 'chat_stream').observe(finished - started)
+            if tokens > 1 and finished > first_token_at:
+                metrics.LLM_TOKENS_PER_SECOND.labels(self.model).observe((tokens - 1) / (finished - first_token_at))
     
-    async def generate_embeddings(self, text: str) -> List[float]:
-        """Generate embeddings for text"""
+    async def chat_completion(self, messages: List[Dict], **kwargs) -> str:
+        """Non-streaming chat completion; errors propagate to the caller"""
         try:
-            response = await self.client.embeddings.create(
-                model=self.embedding_model,
-                input=text
-            )
-            return response.data[0].embedding
+            with metrics.timed(metrics.LLM_REQUEST_SECONDS, self.model, 'chat',
+                               span='llm.chat', model=self.model):
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=kwargs.get('temperature', 0.3),
+                    max_tokens=kwargs.get('max_tokens', 1000)
+                )
         except Exception as e:
-            # Return zero vector as fallback
-            return [0.0] * 1536
+            metrics.LLM_ERRORS.labels(self.model, 'chat', type(e).__name__).inc()
+            raise
+        return response.choices[0].message.content or ""
     
-    async def generate_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts"""
+    async def generate_embeddings(self, text: str) -> Optional[List[float]]:
+        """Generate embeddings for text; None if the provider call failed"""
+        try:
+            with metrics.timed(metrics.LLM_REQUEST_SECONDS, self.embedding_model, 'embeddings',
+                               span='llm.embeddings', model=self.embedding_model, inputs=1):
+                response = await self.client.embeddings.create(
+                    model=self.embedding_model,
+                    input=text,
+                    **self._embedding_options()
+                )
+            return embedding_storage.fit_dimensions(response.data[0].embedding)
+        except Exception as e:
+            metrics.LLM_ERRORS.labels(self.embedding_model, 'embeddings', type(e).__name__).inc()
+            # A placeholder vector would rank results arbitrarily
+            return None
+    
+    async def generate_batch_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Generate embeddings for multiple texts, many inputs per request.
+        Inputs that could not be embedded come back as None rather than a
+        placeholder vector, so they are stored empty and embedded again later.
+        """
         embeddings = []
-        for text in texts:
-            embedding = await self.generate_embeddings(text)
-            embeddings.append(embedding)
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        for start in range(0, len(texts), batch_size):
+            # The API rejects empty inputs
+            embeddings.extend(await self._embed_batch(
+                [text or " " for text in texts[start:start + batch_size]]
+            ))
         return embeddings
+    
+    async def _embed_batch(self, batch: List[str]) -> List[Optional[List[float]]]:
+        try:
+            with metrics.timed(metrics.LLM_REQUEST_SECONDS, self.embedding_model, 'embeddings',
+                               span='llm.embeddings', model=self.embedding_model, inputs=len(batch)):
+                response = await self.client.embeddings.create(
+                    model=self.embedding_model,
+                    input=batch,
+                    **self._embedding_options()
+                )
+            return [
+                embedding_storage.fit_dimensions(item.embedding)
+                for item in sorted(response.data, key=lambda item: item.index)
+            ]
+        except Exception as e:
+            metrics.LLM_ERRORS.labels(self.embedding_model, 'embeddings', type(e).__name__).inc()
+            # A rejected input (e.g. too long) fails its whole request: split
+            # the batch to isolate it. Rate limits and server errors have
+            # already been retried by the client.
+            if getattr(e, 'status_code', None) == 400 and len(batch) > 1:
+                middle = len(batch) // 2
+                return await self._embed_batch(batch[:middle]) + await self._embed_batch(batch[middle:])
+            return [None] * len(batch)
 
 class AnalysisService:
     def __init__(self):
         self.ai_service = AIService()
+        self.summarizer = RollingSummarizer(self.ai_service)
+        self.local_analyzer = LocalAnalyzer()
     
     def generate_summary(self, conversation: Conversation) -> str:
         """Generate conversation summary"""
-        messages = conversation.messages.all()
-        conversation_text = "\n".join([
-            f"{msg.sender}: {msg.content}" for msg in messages
-        ])
-        
-        prompt = f"""
-        Please provide a concise summary of the following conversation.
-        Focus on the main topics, decisions made, and key outcomes.
-        
-        Conversation:
-        {conversation_text}
-        
-        Summary:
-        """
+        messages = list(conversation.messages.all())
+        return run(self.summarizer.summarize(messages))
+    
+    def local_analysis(self, messages: List[Message]) -> Dict[str, Any]:
+        """Sentiment and key points for a batch of messages, computed locally"""
+        texts = [msg.content for msg in messages]
+        scores = self.local_analyzer.message_sentiment(texts)
+        points, salience = self.local_analyzer.key_points(texts, settings.KEY_POINTS_LIMIT)
         
-        # For now, we'll use a synchronous approach
-        # In production, this would be async
-        async def _generate():
-            full_response = ""
-            async for token in self.ai_service.stream_chat_completion([
-                {"role": "user", "content": prompt}
-            ]):
-                full_response += token
-            return full_response
-        
-        return asyncio.run(_generate())
+        return {
+            'sentiment': self.local_analyzer.conversation_sentiment(scores),
+            'key_points': [
+                {
+                    'text': sentence,
+                    'type': kind,
+                    'score': score,
+                    'message_id': str(messages[owner].id),
+                    'sender': messages[owner].sender
+                }
+                for owner, sentence, score, kind in points
+            ],
+            'messages': {
+                msg.id: {
+                    'sentiment': round(float(score), 4),
+                    'sentiment_label': sentiment_label(score),
+                    'salience': round(float(weight), 4)
+                }
+                for msg, score, weight in zip(messages, scores, salience)
+            }
+        }
     
     def extract_key_points(self, conversation: Conversation) -> List[Dict]:
         """Extract key points and action items"""
-        messages = conversation.messages.all()
-        conversation_text = "\n".join([
-            f"{msg.sender}: {msg.content}" for msg in messages
-        ])
-        
-        prompt = f"""
-        Analyze the following conversation and extract:
-        1. Key decisions made
-        2. Action items with owners
-        3. Important topics discussed
-        4. Follow-up requirements
-        
-        Format the response as JSON with keys: decisions, actions, topics, follow_ups.
-        
-        Conversation:
-        {conversation_text}
-        """
-        
-        # Implementation similar to generate_summary
-        # Return structured data
-        return []
+        return self.local_analysis(list(conversation.messages.all()))['key_points']
     
     def analyze_sentiment(self, conversation: Conversation) -> Dict[str, Any]:
         """Analyze conversation sentiment"""
-        # Simple implementation - in production would use more sophisticated analysis
-        return {
-            'score': 0.5,  # Neutral
-            'label': 'neutral',
-            'confidence': 0.8
-        }
+        return self.local_analysis(list(conversation.messages.all()))['sentiment']
     
     def generate_embeddings(self, conversation: Conversation) -> Dict[str, Any]:
         """Generate embeddings for conversation and messages"""
@@ -122,42 +190,167 @@ class AnalysisService:
             msg.content for msg in conversation.messages.all()
         ])
         
-        conversation_embedding = asyncio.run(
+        conversation_embedding = run(
             self.ai_service.generate_embeddings(conversation_text)
         )
         
         # Generate message-level embeddings
         messages = conversation.messages.all()
         message_texts = [msg.content for msg in messages]
-        message_embeddings = asyncio.run(
+        message_embeddings = run(
             self.ai_service.generate_batch_embeddings(message_texts)
         )
         
         # Update messages with embeddings
         for msg, embedding in zip(messages, message_embeddings):
-            msg.embedding = embedding
+            for field, value in embedding_storage.storage_values(embedding).items():
+                setattr(msg, field, value)
             msg.save()
         
         return {
             'conversation_embedding': conversation_embedding,
-            'message_embeddings_count': len(message_embeddings)
+            'message_embeddings_count': sum(embedding is not None for embedding in message_embeddings)
         }
 
+    def analyze_batch(self, conversations: List[Conversation]) -> List[Dict[str, Any]]:
+        """
+        Analyze a group of conversations together. Summaries run concurrently,
+        every conversation and message embedding goes out in shared requests
+        and results are written with one bulk update per model.
+        """
+        with metrics.timed(metrics.ANALYSIS_STAGE_SECONDS, 'load', span='analysis.load'):
+            message_lists = [list(conversation.messages.all()) for conversation in conversations]
+        with metrics.timed(metrics.ANALYSIS_STAGE_SECONDS, 'local', span='analysis.local'):
+            local_results = [self.local_analysis(messages) for messages in message_lists]
+        
+        async def _summaries():
+            return await asyncio.gather(*[
+                self.summarizer.summarize(messages) for messages in message_lists
+            ])
+        
+        with metrics.timed(metrics.ANALYSIS_STAGE_SECONDS, 'summaries', span='analysis.summaries'):
+            summaries = run(_summaries())
+        
+        all_messages = [msg for messages in message_lists for msg in messages]
+        conversation_texts = [
+            summary or " ".join(msg.content for msg in messages)
+            for summary, messages in zip(summaries, message_lists)
+        ]
+        with metrics.timed(metrics.ANALYSIS_STAGE_SECONDS, 'embeddings', span='analysis.embeddings'):
+            vectors = run(self.ai_service.generate_batch_embeddings(
+                conversation_texts + [msg.content for msg in all_messages]
+            ))
+        conversation_vectors = vectors[:len(conversations)]
+        message_vectors = vectors[len(conversations):]
+        
+        for msg, embedding in zip(all_messages, message_vectors):
+            for field, value in embedding_storage.storage_values(embedding).items():
+                setattr(msg, field, value)
+        
+        results = []
+        offset = 0
+        for conversation, messages, local, summary, embedding in zip(
+            conversations, message_lists, local_results, summaries, conversation_vectors
+        ):
+            message_embeddings = message_vectors[offset:offset + len(messages)]
+            offset += len(messages)
+            for msg in messages:
+                msg.metadata.update(local['messages'][msg.id])
+            conversation.summary = summary
+            conversation.metadata.update({
+                'key_points': local['key_points'],
+                'sentiment': local['sentiment'],
+                'analysis_complete': True
+            })
+            # Embeddings that failed are left empty; count the attempts so the
+            # caller can queue the conversation again a bounded number of times
+            missing = (embedding is None) + sum(vector is None for vector in message_embeddings)
+            if missing:
+                conversation.metadata['embedding_attempts'] = conversation.metadata.get('embedding_attempts', 0) + 1
+            else:
+                conversation.metadata.pop('embedding_attempts', None)
+            for field, value in embedding_storage.storage_values(embedding).items():
+                setattr(conversation, field, value)
+            results.append({
+                'conversation_id': str(conversation.id),
+                'summary_generated': bool(summary),
+                'key_points_count': len(local['key_points']),
+                'sentiment_score': local['sentiment'].get('score'),
+                'embeddings_missing': missing,
+                'embedding_attempts': conversation.metadata.get('embedding_attempts', 0)
+            })
+        
+        embedding_fields = embedding_storage.storage_fields()
+        with metrics.timed(metrics.ANALYSIS_STAGE_SECONDS, 'write', span='analysis.write'), transaction.atomic():
+            Message.objects.bulk_update(all_messages, ['metadata'] + embedding_fields, batch_size=500)
+            Conversation.objects.bulk_update(
+                conversations, ['summary', 'metadata'] + embedding_fields, batch_size=500
+            )
+        return results
+
 class ConversationQueryService:
     def __init__(self):
         self.ai_service = AIService()
     
+    def retrieve_messages(self, conversation: Conversation, query_embedding: Optional[List[float]]):
+        """
+        Top-k messages of the conversation closest to the query, each with its
+        neighbouring messages for continuity. Returns (hits, windows) where
+        windows[i] lists the messages around hits[i] in chronological order.
+        """
+        top_k = settings.QUERY_TOP_K
+        window = settings.QUERY_NEIGHBOR_WINDOW
+        hits = []
+        if query_embedding is not None:
+            hits = embedding_storage.nearest(
+                Message.objects.filter(conversation=conversation, embedding__isnull=False),
+                query_embedding,
+                top_k
+            )
+        if not hits:
+            # Messages are embedded once the conversation is analysed, and
+            # the query may have failed to embed; either way fall back to the
+            # latest messages
+            hits = list(Message.objects.filter(conversation=conversation).order_by('-timestamp')[:top_k])
+        if not hits or not window:
+            return hits, [[hit] for hit in hits]
+        
+        # Fetch every neighbourhood in a single query
+        base = Message.objects.filter(conversation=conversation).defer(*embedding_storage.storage_fields())
+        parts = []
+        for hit in hits:
+            parts.append(base.filter(timestamp__lt=hit.timestamp).order_by('-timestamp')[:window])
+            parts.append(base.filter(timestamp__gt=hit.timestamp).order_by('timestamp')[:window])
+        neighbours = parts[0].union(*parts[1:], all=True)
+        neighbours = sorted({msg.id: msg for msg in neighbours}.values(), key=lambda msg: msg.timestamp)
+        
+        windows = []
+        for hit in hits:
+            before = [msg for msg in neighbours if msg.timestamp < hit.timestamp][-window:]
+            after = [msg for msg in neighbours if msg.timestamp > hit.timestamp][:window]
+            windows.append(before + [hit] + after)
+        return hits, windows
+    
     def query_conversation(self, conversation: Conversation, query: str) -> Dict[str, Any]:
         """Answer questions about a specific conversation"""
-        messages = conversation.messages.all()
-        context = "\n".join([
-            f"{msg.sender}: {msg.content}" for msg in messages
-        ])
+        query_embedding = run(self.ai_service.generate_embeddings(query))
+        with metrics.timed(metrics.SEARCH_SECONDS, 'retrieve', span='search.retrieve'):
+            hits, windows = self.retrieve_messages(conversation, query_embedding)
+        
+        # Pack the most relevant neighbourhoods into the token budget, then
+        # present the surviving messages in conversation order
+        kept = pack_to_budget(
+            [[f"{msg.sender}: {msg.content}" for msg in group] for group in windows],
+            settings.QUERY_CONTEXT_TOKENS
+        )
+        selected = {msg.id: msg for i in kept for msg in windows[i]}
+        context = format_messages(sorted(selected.values(), key=lambda msg: msg.timestamp))
         
         prompt = f"""
-        Based on the following conversation, please answer the user's question.
+        Based on the following excerpts from a conversation, please answer the user's question.
+        If the excerpts don't contain the answer, say so.
         
-        Conversation:
+        Conversation excerpts:
         {context}
         
         Question: {query}
@@ -165,21 +358,24 @@ class ConversationQueryService:
         Answer:
         """
         
-        async def _generate_answer():
-            full_response = ""
-            async for token in self.ai_service.stream_chat_completion([
-                {"role": "user", "content": prompt}
-            ]):
-                full_response += token
-            return full_response
-        
-        answer = asyncio.run(_generate_answer())
+        answer = run(self.ai_service.chat_completion([
+            {"role": "user", "content": prompt}
+        ]))
         
         return {
             'answer': answer,
             'conversation_id': str(conversation.id),
             'conversation_title': conversation.title,
-            'sources': []  # Could include specific message references
+            'sources': [
+                {
+                    'id': str(hits[i].id),
+                    'sender': hits[i].sender,
+                    'timestamp': hits[i].timestamp,
+                    # None when the hits are the latest messages, not a ranking
+                    'similarity': float(hits[i].similarity) if hasattr(hits[i], 'similarity') else None
+                }
+                for i in kept
+            ]
         }
 
 class SemanticSearchService:
@@ -189,24 +385,31 @@ class SemanticSearchService:
     async def search_conversations(self, query: str, filters: Dict = None, limit: int = 10):
         """Semantic search across all conversations"""
         from chat.models import Conversation, Message
-        from pgvector.django import L2Distance
+        from asgiref.sync import sync_to_async
         
         # Generate query embedding
-        query_embedding = await self.ai_service.generate_embeddings(query)
+        with metrics.timed(metrics.SEARCH_SECONDS, 'embed', span='search.embed'):
+            query_embedding = await self.ai_service.generate_embeddings(query)
+        if query_embedding is None:
+            raise RuntimeError("Could not embed the query; try again")
         
         # Search conversations
-        similar_convos = Conversation.objects.annotate(
-            similarity=L2Distance('embedding', query_embedding)
-        ).filter(
-            status=Conversation.STATUS_ENDED
-        ).order_by('similarity')[:limit]
+        with metrics.timed(metrics.SEARCH_SECONDS, 'conversations', span='search.conversations'):
+            similar_convos = await sync_to_async(embedding_storage.nearest)(
+                Conversation.objects.filter(status=Conversation.STATUS_ENDED, embedding__isnull=False),
+                query_embedding,
+                limit
+            )
         
         # Search individual messages
-        similar_messages = Message.objects.annotate(
-            similarity=L2Distance('embedding', query_embedding)
-        ).filter(
-            conversation__status=Conversation.STATUS_ENDED
-        ).select_related('conversation').order_by('similarity')[:limit]
+        with metrics.timed(metrics.SEARCH_SECONDS, 'messages', span='search.messages'):
+            similar_messages = await sync_to_async(embedding_storage.nearest)(
+                Message.objects.filter(
+                    conversation__status=Conversation.STATUS_ENDED, embedding__isnull=False
+                ).select_related('conversation'),
+                query_embedding,
+                limit
+            )
         
         return {
             'conversations': [
@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+from typing import Dict, List, Sequence
+from django.conf import settings
+from django.core.cache import cache
+
+CHUNK_PROMPT = """
+Summarize this part of a conversation in a few sentences.
+Keep decisions, action items with owners, open questions and named entities.
+
+Conversation excerpt:
+{text}
+
+Summary:
+"""
+
+MERGE_PROMPT = """
+The following are summaries of consecutive parts of one conversation, in order.
+Combine them into a single concise summary focused on the main topics,
+decisions made, and key outcomes.
+
+{text}
+
+Summary:
+"""
+
+
+def format_messages(messages: Sequence) -> str:
+    return "\n".join(f"{msg.sender}: {msg.content}" for msg in messages)
+
+
+def chunk_messages(messages: Sequence, size: int) -> List[Sequence]:
+    return [messages[i:i + size] for i in range(0, len(messages), size)]
+
+
+class RollingSummarizer:
+    """
+    Map-reduce summarizer for long conversations.
+
+    Messages are split into fixed-size chunks which are summarized once and
+    cached under a hash of their content, then merged hierarchically
+    `fanout` summaries at a time. Only chunks whose content changed since the
+    last run (in practice the trailing ones) reach the model again.
+    """
+
+    def __init__(self, ai_service, chunk_size: int = None, fanout: int = None):
+        self.ai_service = ai_service
+        self.chunk_size = chunk_size or settings.SUMMARY_CHUNK_SIZE
+        self.fanout = fanout or settings.SUMMARY_MERGE_FANOUT
+        self._loop = None
+        self._semaphore = None
+
+    def _limiter(self) -> asyncio.Semaphore:
+        # Sync callers use clients.run()'s loop, async ones their own; bind per loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(settings.SUMMARY_CONCURRENCY)
+        return self._semaphore
+
+    def _key(self, kind: str, content: str) -> str:
+        digest = hashlib.sha256(
+            f"{self.ai_service.model}\0{content}".encode('utf-8')
+        ).hexdigest()
+        return f"summary:{kind}:{digest}"
+
+    async def _cached_completion(self, key: str, prompt: str) -> str:
+        summary = await cache.aget(key)
+        if summary is None:
+            async with self._limiter():
+                summary = await self.ai_service.chat_completion([
+                    {"role": "user", "content": prompt}
+                ])
+            await cache.aset(key, summary, settings.SUMMARY_CACHE_TTL)
+        return summary
+
+    async def chunk_summaries(self, messages: Sequence) -> List[Dict[str, str]]:
+        """Summaries of each message chunk, as {'key', 'summary'} in order"""
+        texts = [format_messages(chunk) for chunk in chunk_messages(messages, self.chunk_size)]
+        keys = [self._key('chunk', text) for text in texts]
+        summaries = await asyncio.gather(*[
+            self._cached_completion(key, CHUNK_PROMPT.format(text=text))
+            for key, text in zip(keys, texts)
+        ])
+        return [{'key': key, 'summary': summary} for key, summary in zip(keys, summaries)]
+
+    async def _merge(self, nodes: List[Dict[str, str]]) -> Dict[str, str]:
+        key = self._key('merge', "\0".join(node['key'] for node in nodes))
+        text = "\n\n".join(
+            f"Part {i}:\n{node['summary']}" for i, node in enumerate(nodes, 1)
+        )
+        summary = await self._cached_completion(key, MERGE_PROMPT.format(text=text))
+        return {'key': key, 'summary': summary}
+
+    async def summarize(self, messages: Sequence) -> str:
+        """Summary of the whole message sequence"""
+        nodes = await self.chunk_summaries(messages)
+        if not nodes:
+            return ""
+        while len(nodes) > 1:
+            nodes = await asyncio.gather(*[
+                self._merge(nodes[i:i + self.fanout])
+                for i in range(0, len(nodes), self.fanout)
+            ])
+        return nodes[0]['summary']
@@ -0,0 +1,24 @@
+from typing import Iterable, List, Sequence
+
+# Average characters per token for English text with OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for prompt budgeting"""
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def pack_to_budget(groups: Iterable[Sequence[str]], budget: int) -> List[int]:
+    """
+    Indexes of the groups that fit in `budget` tokens, taken in priority order.
+    A group is kept or dropped as a whole; later, smaller groups may still fit.
+    """
+    kept = []
+    used = 0
+    for index, group in enumerate(groups):
+        cost = sum(estimate_tokens(text) for text in group)
+        if used + cost <= budget:
+            kept.append(index)
+            used += cost
+    return kept
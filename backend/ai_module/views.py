@@ -1,10 +1,21 @@
+from asgiref.sync import async_to_sync
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from chat.models import Conversation
+from chat.scheduling import AnalysisQueue, LANE_BACKFILL
+from core.singleflight import SingleFlight
 from .services import SemanticSearchService
 
+# Identical requests in flight together share one embedding, scan and
+# completion; keyed per user so results never cross accounts
+rag_flight = SingleFlight('rag')
+search_flight = SingleFlight('search')
+
 class AIQueryView(APIView):
-    async def post(self, request):
+    # DRF views are synchronous; async_to_sync runs the service on the
+    # server's event loop and lets its sync_to_async ORM calls return here
+    def post(self, request):
         query = request.data.get('query')
         filters = request.data.get('filters', {})
         
@@ -16,7 +27,10 @@ class AIQueryView(APIView):
         
         try:
             search_service = SemanticSearchService()
-            result = await search_service.rag_query(query, filters)
+            result = rag_flight.do(
+                rag_flight.key(request.user.id, query, filters),
+                lambda: async_to_sync(search_service.rag_query)(query, filters)
+            )
             return Response(result)
         except Exception as e:
             return Response(
@@ -25,7 +39,7 @@ class AIQueryView(APIView):
             )
 
 class SemanticSearchView(APIView):
-    async def post(self, request):
+    def post(self, request):
         query = request.data.get('query')
         filters = request.data.get('filters', {})
         limit = request.data.get('limit', 10)
@@ -38,7 +52,10 @@ class SemanticSearchView(APIView):
         
         try:
             search_service = SemanticSearchService()
-            result = await search_service.search_conversations(query, filters, limit)
+            result = search_flight.do(
+                search_flight.key(request.user.id, query, filters, limit),
+                lambda: async_to_sync(search_service.search_conversations)(query, filters, limit)
+            )
             return Response(result)
         except Exception as e:
             return Response(
@@ -48,6 +65,19 @@ class SemanticSearchView(APIView):
 
 class ReindexView(APIView):
     def post(self, request):
-        # This would trigger reindexing of all conversations
-        # Implementation would depend on specific requirements
-        return Response({'status': 'Reindexing started'})
\ No newline at end of file
+        # Re-analysis goes through the backfill lane so it never delays
+        # conversations that just ended
+        conversation_ids = Conversation.objects.filter(
+            created_by=request.user,
+            status=Conversation.STATUS_ENDED
+        ).values_list('id', flat=True)
+        queue = AnalysisQueue()
+        queued = 0
+        batch = []
+        for conversation_id in conversation_ids.iterator():
+            batch.append(conversation_id)
+            if len(batch) == 1000:
+                queued += queue.enqueue(batch, LANE_BACKFILL)
+                batch = []
+        queued += queue.enqueue(batch, LANE_BACKFILL)
+        return Response({'status': 'Reindexing started', 'queued': queued})
\ No newline at end of file
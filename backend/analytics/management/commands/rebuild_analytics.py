@@ -0,0 +1,16 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from analytics import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily analytics rollups from conversations and messages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', metavar='USERNAME',
+                            help='only this user; repeat for several (default: everyone)')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username__in=options['users']) if options['users'] else None
+        rows = rollups.rebuild(users)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} user-days"))
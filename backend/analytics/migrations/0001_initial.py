@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('conversations_started', models.IntegerField(default=0)),
+                ('conversations_ended', models.IntegerField(default=0)),
+                ('messages', models.IntegerField(default=0)),
+                ('user_messages', models.IntegerField(default=0)),
+                ('ai_messages', models.IntegerField(default=0)),
+                ('tokens', models.BigIntegerField(default=0)),
+                ('duration_seconds', models.FloatField(default=0)),
+                ('analyzed', models.IntegerField(default=0)),
+                ('sentiment_score', models.FloatField(default=0)),
+                ('sentiment_positive', models.IntegerField(default=0)),
+                ('sentiment_neutral', models.IntegerField(default=0)),
+                ('sentiment_negative', models.IntegerField(default=0)),
+                ('key_points', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyuserstats',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='daily_user_stats_user_day'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+class DailyUserStats(models.Model):
+    """
+    One user's chat activity on one day, kept current as messages are saved
+    and conversations end or are analysed (see analytics.rollups), so
+    dashboards read a row per day instead of scanning messages.
+
+    Conversations count on the day they started and the day they ended,
+    messages on the day they were sent. Durations, sentiment and key points
+    belong to the end day and are totals; divide by conversations_ended or
+    analyzed for averages.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    conversations_started = models.IntegerField(default=0)
+    conversations_ended = models.IntegerField(default=0)
+    messages = models.IntegerField(default=0)
+    user_messages = models.IntegerField(default=0)
+    ai_messages = models.IntegerField(default=0)
+    tokens = models.BigIntegerField(default=0)
+    duration_seconds = models.FloatField(default=0)
+    analyzed = models.IntegerField(default=0)
+    sentiment_score = models.FloatField(default=0)
+    sentiment_positive = models.IntegerField(default=0)
+    sentiment_neutral = models.IntegerField(default=0)
+    sentiment_negative = models.IntegerField(default=0)
+    key_points = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='daily_user_stats_user_day'),
+        ]
+        ordering = ['day']
+
+    def __str__(self):
+        return f"{self.user_id} {self.day}"
@@ -0,0 +1,199 @@
+"""
+Incremental maintenance of DailyUserStats.
+
+Message and conversation-start counters are bumped with one upsert as the
+rows are written. The fields derived from ended conversations (duration,
+sentiment, key points) are recomputed for the touched user-days from the
+Conversation table whenever a conversation ends or is analysed, so
+re-analysis cannot count a conversation twice. `rebuild` recomputes
+everything from the raw tables, for backfills and repairs.
+
+The counter upserts and the refreshes run in a savepoint: if one fails the
+chat write or analysis it belongs to still commits, and the drift is logged
+for `rebuild` to repair.
+"""
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, FloatField, Func, IntegerField, Q, Sum
+from django.db.models.fields.json import KT, KeyTransform
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+from chat.models import Conversation, Message
+from .models import DailyUserStats
+
+COUNTERS = ('conversations_started', 'messages', 'user_messages', 'ai_messages', 'tokens')
+ENDED_FIELDS = (
+    'conversations_ended', 'duration_seconds', 'analyzed', 'sentiment_score',
+    'sentiment_positive', 'sentiment_neutral', 'sentiment_negative', 'key_points',
+)
+ANALYZED = Q(metadata__analysis_complete=True)
+
+logger = logging.getLogger(__name__)
+
+
+def day_of(timestamp):
+    return timezone.localdate(timestamp) if timezone.is_aware(timestamp) else timestamp.date()
+
+
+def increment(user_id, day, **deltas):
+    """Add `deltas` to a user-day's counters in one statement, creating the row if needed"""
+    table = DailyUserStats._meta.db_table
+    columns = COUNTERS + ENDED_FIELDS
+    updates = ", ".join(f"{column} = {table}.{column} + EXCLUDED.{column}" for column in deltas)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, day, {', '.join(columns)}, updated_at) "
+            f"VALUES (%s, %s, {', '.join(['%s'] * len(columns))}, %s) "
+            f"ON CONFLICT (user_id, day) DO UPDATE SET {updates}, updated_at = EXCLUDED.updated_at",
+            [user_id, day, *(deltas.get(column, 0) for column in columns), timezone.now()]
+        )
+
+
+@contextmanager
+def best_effort():
+    try:
+        with transaction.atomic():
+            yield
+    except DatabaseError:
+        logger.exception("Analytics rollup update failed; run rebuild_analytics to repair")
+
+
+def record_message(user_id, message: Message):
+    with best_effort():
+        increment(
+            user_id, day_of(message.timestamp),
+            messages=1,
+            user_messages=int(message.sender == Message.SENDER_USER),
+            ai_messages=int(message.sender == Message.SENDER_AI),
+            tokens=message.tokens or 0
+        )
+
+
+def record_conversation_started(conversation: Conversation):
+    with best_effort():
+        increment(conversation.created_by_id, day_of(conversation.start_ts), conversations_started=1)
+
+
+def ended_totals(conversations) -> Dict[Tuple[int, object], Dict[str, float]]:
+    """Ended-conversation fields of DailyUserStats by (user_id, day), for a Conversation queryset"""
+    rows = (
+        conversations.filter(end_ts__isnull=False)
+        .annotate(day=TruncDate('end_ts'))
+        .values('created_by_id', 'day')
+        .annotate(
+            conversations_ended=Count('id'),
+            duration=Sum(ExpressionWrapper(F('end_ts') - F('start_ts'), output_field=DurationField())),
+            analyzed=Count('id', filter=ANALYZED),
+            sentiment_score=Sum(Cast(KT('metadata__sentiment__score'), FloatField()), filter=ANALYZED, default=0),
+            sentiment_positive=Count('id', filter=ANALYZED & Q(metadata__sentiment__label='positive')),
+            sentiment_neutral=Count('id', filter=ANALYZED & Q(metadata__sentiment__label='neutral')),
+            sentiment_negative=Count('id', filter=ANALYZED & Q(metadata__sentiment__label='negative')),
+            key_points=Sum(
+                Func(KeyTransform('key_points', 'metadata'), function='jsonb_array_length', output_field=IntegerField()),
+                filter=ANALYZED, default=0
+            ),
+        )
+        .order_by()
+    )
+    totals = {}
+    for row in rows:
+        duration = row.pop('duration')
+        key = (row.pop('created_by_id'), row.pop('day'))
+        totals[key] = dict(row, duration_seconds=duration.total_seconds() if duration else 0)
+    return totals
+
+
+def refresh_ended(pairs: Iterable[Tuple[int, object]]):
+    """Recompute the ended-conversation fields of the given (user_id, day) pairs"""
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return
+    with best_effort():
+        # Refreshes of the same user-day run one at a time, so one that read
+        # older totals cannot overwrite a later one's. Locks are taken in
+        # order so overlapping refreshes cannot deadlock.
+        with connection.cursor() as cursor:
+            for user_id, day in pairs:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [user_id, day.toordinal()])
+        query = Q()
+        for user_id, day in pairs:
+            query |= Q(created_by_id=user_id, end_ts__date=day)
+        totals = ended_totals(Conversation.objects.filter(query))
+        empty = dict.fromkeys(ENDED_FIELDS, 0)
+        DailyUserStats.objects.bulk_create(
+            [DailyUserStats(user_id=user_id, day=day, **totals.get((user_id, day), empty)) for user_id, day in pairs],
+            update_conflicts=True,
+            unique_fields=['user', 'day'],
+            update_fields=list(ENDED_FIELDS) + ['updated_at']
+        )
+
+
+def refresh_conversations(conversations: Iterable[Conversation]):
+    """Recompute the user-days of conversations that ended or were re-analysed"""
+    refresh_ended(
+        (conversation.created_by_id, day_of(conversation.end_ts))
+        for conversation in conversations if conversation.end_ts
+    )
+
+
+def message_totals(messages):
+    return (
+        messages.annotate(day=TruncDate('timestamp'))
+        .values('conversation__created_by_id', 'day')
+        .annotate(
+            messages=Count('id'),
+            user_messages=Count('id', filter=Q(sender=Message.SENDER_USER)),
+            ai_messages=Count('id', filter=Q(sender=Message.SENDER_AI)),
+            tokens=Sum('tokens', default=0),
+        )
+        .order_by()
+    )
+
+
+def delete_conversation(conversation: Conversation):
+    """Delete a conversation and take it out of its owner's rollups"""
+    with transaction.atomic():
+        increment(conversation.created_by_id, day_of(conversation.start_ts), conversations_started=-1)
+        for row in message_totals(conversation.messages.all()):
+            increment(
+                row['conversation__created_by_id'], row['day'],
+                **{field: -row[field] for field in ('messages', 'user_messages', 'ai_messages', 'tokens')}
+            )
+        conversation.delete()
+        refresh_conversations([conversation])
+
+
+def rebuild(users=None) -> int:
+    """Recompute the rollups of `users` (everyone by default) from the raw tables"""
+    conversations = Conversation.objects.all()
+    messages = Message.objects.all()
+    stats = DailyUserStats.objects.all()
+    if users is not None:
+        conversations = conversations.filter(created_by__in=users)
+        messages = messages.filter(conversation__created_by__in=users)
+        stats = stats.filter(user__in=users)
+
+    rows = defaultdict(dict)
+    started = (
+        conversations.annotate(day=TruncDate('start_ts'))
+        .values('created_by_id', 'day')
+        .annotate(conversations_started=Count('id'))
+        .order_by()
+    )
+    for row in started:
+        rows[(row.pop('created_by_id'), row.pop('day'))].update(row)
+    for row in message_totals(messages):
+        rows[(row.pop('conversation__created_by_id'), row.pop('day'))].update(row)
+    for key, fields in ended_totals(conversations).items():
+        rows[key].update(fields)
+
+    with transaction.atomic():
+        stats.delete()
+        DailyUserStats.objects.bulk_create(
+            [DailyUserStats(user_id=user_id, day=day, **fields) for (user_id, day), fields in rows.items()],
+            batch_size=1000
+        )
+    return len(rows)
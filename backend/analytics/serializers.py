@@ -0,0 +1,32 @@
+from rest_framework import serializers
+from .models import DailyUserStats
+
+class DailyUserStatsSerializer(serializers.ModelSerializer):
+    avg_duration_seconds = serializers.SerializerMethodField()
+    avg_sentiment = serializers.SerializerMethodField()
+    sentiment = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DailyUserStats
+        fields = [
+            'day', 'conversations_started', 'conversations_ended', 'messages',
+            'user_messages', 'ai_messages', 'tokens', 'avg_duration_seconds',
+            'analyzed', 'avg_sentiment', 'sentiment', 'key_points'
+        ]
+
+    def get_avg_duration_seconds(self, obj):
+        if obj.conversations_ended:
+            return round(obj.duration_seconds / obj.conversations_ended, 1)
+        return None
+
+    def get_avg_sentiment(self, obj):
+        if obj.analyzed:
+            return round(obj.sentiment_score / obj.analyzed, 4)
+        return None
+
+    def get_sentiment(self, obj):
+        return {
+            'positive': obj.sentiment_positive,
+            'neutral': obj.sentiment_neutral,
+            'negative': obj.sentiment_negative,
+        }
@@ -0,0 +1,80 @@
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from chat.models import Conversation, Message
+from analytics import rollups
+from analytics.models import DailyUserStats
+
+FIELDS = ('day',) + rollups.COUNTERS + rollups.ENDED_FIELDS
+
+
+class RollupTests(TestCase):
+    """Run against PostgreSQL: the rollups use ON CONFLICT, jsonb and advisory locks"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+
+    def snapshot(self):
+        return list(DailyUserStats.objects.filter(user=self.user).order_by('day').values(*FIELDS))
+
+    def chat(self, analysed=False):
+        conversation = Conversation.objects.create(title='Standup', created_by=self.user)
+        rollups.record_conversation_started(conversation)
+        for sender, content, tokens in [
+            (Message.SENDER_USER, 'Can we ship the release on Friday?', None),
+            (Message.SENDER_AI, 'Yes, once the migration is reviewed.', 7),
+        ]:
+            message = Message.objects.create(conversation=conversation, sender=sender, content=content, tokens=tokens)
+            rollups.record_message(self.user.id, message)
+        conversation.status = Conversation.STATUS_ENDED
+        conversation.end_ts = conversation.start_ts + timedelta(seconds=90)
+        if analysed:
+            conversation.metadata = {
+                'analysis_complete': True,
+                'sentiment': {'score': 0.5, 'label': 'positive'},
+                'key_points': [{'text': 'Ship on Friday'}, {'text': 'Review the migration'}],
+            }
+        conversation.save()
+        rollups.refresh_conversations([conversation])
+        return conversation
+
+    def test_increment_inserts_then_adds(self):
+        day = rollups.day_of(self.user.date_joined)
+        rollups.increment(self.user.id, day, messages=1, tokens=5)
+        rollups.increment(self.user.id, day, messages=2, ai_messages=1, tokens=-1)
+        stats = DailyUserStats.objects.get(user=self.user, day=day)
+        self.assertEqual(
+            (stats.messages, stats.user_messages, stats.ai_messages, stats.tokens, stats.conversations_started),
+            (3, 0, 1, 4, 0)
+        )
+
+    def test_increment_leaves_other_fields(self):
+        day = rollups.day_of(self.user.date_joined)
+        rollups.increment(self.user.id, day, messages=1)
+        DailyUserStats.objects.filter(user=self.user, day=day).update(conversations_ended=2, key_points=3)
+        rollups.increment(self.user.id, day, messages=1)
+        stats = DailyUserStats.objects.get(user=self.user, day=day)
+        self.assertEqual((stats.messages, stats.conversations_ended, stats.key_points), (2, 2, 3))
+
+    def test_refresh_counts_an_analysis_once(self):
+        conversation = self.chat(analysed=True)
+        rollups.refresh_conversations([conversation])
+        stats = DailyUserStats.objects.get(user=self.user, day=rollups.day_of(conversation.end_ts))
+        self.assertEqual(
+            (stats.conversations_ended, stats.analyzed, stats.sentiment_positive, stats.key_points),
+            (1, 1, 1, 2)
+        )
+        self.assertEqual(stats.sentiment_score, 0.5)
+        self.assertEqual(stats.duration_seconds, 90)
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.chat(analysed=True)
+        self.chat()
+        rollups.delete_conversation(self.chat(analysed=True))
+        incremental = self.snapshot()
+        self.assertEqual(sum(row['messages'] for row in incremental), 4)
+        self.assertEqual(sum(row['tokens'] for row in incremental), 14)
+
+        DailyUserStats.objects.all().delete()
+        rollups.rebuild([self.user])
+        self.assertEqual(self.snapshot(), incremental)
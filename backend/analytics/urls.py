@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('daily/', views.DailyStatsView.as_view(), name='analytics-daily'),
+]
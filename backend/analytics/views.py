@@ -0,0 +1,75 @@
+import hashlib
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from .models import DailyUserStats
+from .rollups import COUNTERS, ENDED_FIELDS, day_of
+from .serializers import DailyUserStatsSerializer
+
+class DailyStatsView(APIView):
+    """
+    Per-day rollups of the user's chat activity between ?from= and ?to=
+    (ISO dates, default the last ANALYTICS_DEFAULT_DAYS days up to today as
+    the rollups bucket it), with totals. Days without activity are left out.
+
+    The ETag comes from the range's latest row update, one aggregate over at
+    most ANALYTICS_MAX_DAYS rows, so an unchanged dashboard gets a 304
+    without the payload being built. Built payloads are cached under their
+    ETag.
+    """
+
+    def get(self, request):
+        try:
+            end = date.fromisoformat(request.query_params['to']) if 'to' in request.query_params else day_of(timezone.now())
+            start = (
+                date.fromisoformat(request.query_params['from']) if 'from' in request.query_params
+                else end - timedelta(days=settings.ANALYTICS_DEFAULT_DAYS - 1)
+            )
+        except ValueError:
+            return Response(
+                {'error': 'from and to must be dates (YYYY-MM-DD)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if start > end or (end - start).days >= settings.ANALYTICS_MAX_DAYS:
+            return Response(
+                {'error': f"Date range must be at most {settings.ANALYTICS_MAX_DAYS} days"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = DailyUserStats.objects.filter(user=request.user, day__range=(start, end))
+        version = rows.aggregate(updated_at=Max('updated_at'), days=Count('id'))
+        etag = quote_etag(hashlib.sha1(
+            f"{request.user.id}:{start}:{end}:{version['updated_at']}:{version['days']}".encode('utf-8')
+        ).hexdigest())
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache_key = f"analytics:daily:{etag}"
+            payload = cache.get(cache_key)
+            if payload is None:
+                payload = self.build(rows, start, end)
+                cache.set(cache_key, payload, settings.ANALYTICS_CACHE_TTL)
+            response = Response(payload)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=settings.ANALYTICS_MAX_AGE)
+        return response
+
+    def build(self, rows, start, end):
+        fields = COUNTERS + ENDED_FIELDS
+        totals = rows.aggregate(**{field: Sum(field, default=0) for field in fields})
+        total = DailyUserStatsSerializer(DailyUserStats(**totals)).data
+        total.pop('day')
+        return {
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'days': DailyUserStatsSerializer(rows, many=True).data,
+            'totals': total,
+        }
@@ -0,0 +1,258 @@
+"""
+Multi-process routing and throughput harness for the sharded channel layers.
+
+Subscriber processes stand in for ASGI workers: each holds sockets joined
+to conversation groups, with every group's members spread over several
+processes. Publisher processes group_send a numbered run of messages to
+every group. Each socket checks it received exactly its own group's
+messages, in order, and the harness checks every group was placed on the
+host the layer's hash assigns it to and on no other. The run is repeated
+with the first 1, 2, 4... hosts to show throughput as shards are added.
+
+    python benchmarks/channel_shards.py --backend core \\
+        --hosts redis://localhost:6379/0 redis://localhost:6380/0 redis://localhost:6381/0 redis://localhost:6382/0
+
+Throughput only scales with separate Redis servers; several databases of
+one server are enough to check routing with the core layer. Pub/sub
+channels are not scoped to a database, so the pubsub placement check needs
+separate servers and is skipped otherwise.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis  # noqa: E402
+from chat.streams import conversation_group  # noqa: E402
+from core.channel_layers import (  # noqa: E402
+    ShardedRedisChannelLayer, ShardedRedisPubSubChannelLayer, jump_hash
+)
+
+
+def make_layer(backend, hosts, prefix):
+    if backend == 'pubsub':
+        return ShardedRedisPubSubChannelLayer(hosts=hosts, prefix=prefix)
+    return ShardedRedisChannelLayer(hosts=hosts, prefix=prefix, capacity=100000)
+
+
+async def close_layer(backend, layer):
+    # flush() on the core layer deletes every key under the prefix, which
+    # would clobber the other processes, so only the coordinator calls it
+    if backend == 'pubsub':
+        await layer.flush()
+    else:
+        await layer.close_pools()
+
+
+async def drain(layer, group, channel, messages, deadline):
+    seqs, misrouted, last = [], 0, 0.0
+    while len(seqs) < messages:
+        timeout = deadline - time.time()
+        if timeout <= 0:
+            break
+        try:
+            message = await asyncio.wait_for(layer.receive(channel), timeout)
+        except asyncio.TimeoutError:
+            break
+        if message['group'] != group:
+            misrouted += 1
+            continue
+        seqs.append(message['seq'])
+        last = time.time()
+    return {
+        'received': len(seqs),
+        'misrouted': misrouted,
+        'out_of_order': int(seqs != sorted(seqs) or len(set(seqs)) != len(seqs)),
+        'last': last,
+    }
+
+
+async def subscribe(backend, hosts, prefix, groups, messages, timeout, ready, results):
+    layer = make_layer(backend, hosts, prefix)
+    sockets = []
+    for group in groups:
+        channel = await layer.new_channel()
+        await layer.group_add(group, channel)
+        sockets.append((group, channel))
+    ready.put(os.getpid())
+    deadline = time.time() + timeout
+    reports = await asyncio.gather(*[
+        drain(layer, group, channel, messages, deadline) for group, channel in sockets
+    ])
+    results.put({
+        'received': sum(r['received'] for r in reports),
+        'misrouted': sum(r['misrouted'] for r in reports),
+        'out_of_order': sum(r['out_of_order'] for r in reports),
+        'last': max((r['last'] for r in reports), default=0.0),
+    })
+    await close_layer(backend, layer)
+
+
+async def publish(backend, hosts, prefix, groups, messages, start_at, results):
+    layer = make_layer(backend, hosts, prefix)
+    await asyncio.sleep(max(start_at - time.time(), 0))
+    started = time.time()
+
+    async def send(group):
+        for seq in range(messages):
+            await layer.group_send(group, {'type': 'bench.message', 'group': group, 'seq': seq})
+
+    await asyncio.gather(*[send(group) for group in groups])
+    results.put({'started': started})
+    await close_layer(backend, layer)
+
+
+def run_subscriber(*args):
+    asyncio.run(subscribe(*args))
+
+
+def run_publisher(*args):
+    asyncio.run(publish(*args))
+
+
+def _server(url):
+    kwargs = redis.Redis.from_url(url).connection_pool.connection_kwargs
+    return kwargs.get('host'), kwargs.get('port'), kwargs.get('path')
+
+
+def check_placement(backend, hosts, prefix, groups):
+    """Groups found on a host other than the one the hash assigns, or None if unchecked"""
+    layer = make_layer(backend, hosts, prefix)
+    clients = [redis.Redis.from_url(host) for host in hosts]
+    misplaced = 0
+    if backend == 'pubsub':
+        if len({_server(host) for host in hosts}) < len(hosts):
+            return None
+        names = [f"{prefix}__group__{group}" for group in groups]
+        counts = [dict(client.pubsub_numsub(*names)) for client in clients]
+        for group, name in zip(groups, names):
+            expected = jump_hash(name, len(hosts))
+            placed = [i for i, count in enumerate(counts) if count.get(name.encode(), 0) > 0]
+            misplaced += placed != [expected]
+    else:
+        for group in groups:
+            key = layer._group_key(group)
+            placed = [i for i, client in enumerate(clients) if client.exists(key)]
+            misplaced += placed != [layer.consistent_hash(group)]
+    for client in clients:
+        client.close()
+    return misplaced
+
+
+async def flush(backend, hosts, prefix):
+    layer = make_layer(backend, hosts, prefix)
+    await layer.flush()
+
+
+def run(args, hosts):
+    ctx = multiprocessing.get_context('spawn')
+    prefix = f"bench{uuid.uuid4().hex[:8]}"
+    groups = [conversation_group(uuid.uuid4()) for _ in range(args.groups)]
+    # Member j of group i lives in process i + j, so every group fans out
+    # across several workers
+    members = [[] for _ in range(args.subscribers)]
+    for i, group in enumerate(groups):
+        for j in range(args.members):
+            members[(i + j) % args.subscribers].append(group)
+    owned = [groups[i::args.publishers] for i in range(args.publishers)]
+
+    ready, results, sent = ctx.Queue(), ctx.Queue(), ctx.Queue()
+    subscribers = [
+        ctx.Process(target=run_subscriber, args=(
+            args.backend, hosts, prefix, part, args.messages, args.timeout, ready, results
+        ))
+        for part in members
+    ]
+    for process in subscribers:
+        process.start()
+    for _ in subscribers:
+        ready.get(timeout=args.timeout)
+
+    misplaced = check_placement(args.backend, hosts, prefix, groups)
+
+    start_at = time.time() + 0.5
+    publishers = [
+        ctx.Process(target=run_publisher, args=(
+            args.backend, hosts, prefix, part, args.messages, start_at, sent
+        ))
+        for part in owned
+    ]
+    for process in publishers:
+        process.start()
+
+    reports = []
+    for _ in subscribers:
+        try:
+            reports.append(results.get(timeout=args.timeout + 5))
+        except queue.Empty:
+            break
+    started = []
+    for _ in publishers:
+        try:
+            started.append(sent.get(timeout=5)['started'])
+        except queue.Empty:
+            break
+    for process in publishers + subscribers:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    asyncio.run(flush(args.backend, hosts, prefix))
+
+    expected = args.groups * args.members * args.messages
+    received = sum(r['received'] for r in reports)
+    last = max((r['last'] for r in reports), default=0.0)
+    elapsed = last - min(started) if started and received else 0.0
+    return {
+        'expected': expected,
+        'received': received,
+        'misrouted': sum(r['misrouted'] for r in reports),
+        'out_of_order': sum(r['out_of_order'] for r in reports),
+        'misplaced': misplaced,
+        'sends_per_s': args.groups * args.messages / elapsed if elapsed > 0 else 0.0,
+        'deliveries_per_s': received / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['core', 'pubsub'], default='core')
+    parser.add_argument('--hosts', nargs='+', default=os.getenv(
+        'REDIS_CHANNEL_HOSTS', os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    ).split(','))
+    parser.add_argument('--shards', type=int, nargs='+', help='host counts to run, default 1, 2, 4... up to all hosts')
+    parser.add_argument('--subscribers', type=int, default=4, help='subscriber processes')
+    parser.add_argument('--publishers', type=int, default=2, help='publisher processes')
+    parser.add_argument('--groups', type=int, default=200)
+    parser.add_argument('--members', type=int, default=3, help='sockets per group')
+    parser.add_argument('--messages', type=int, default=50, help='messages sent to each group')
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+    args.members = min(args.members, args.subscribers)
+
+    shards = args.shards or [n for n in (1, 2, 4, 8, 16) if n < len(args.hosts)] + [len(args.hosts)]
+    print(f"backend={args.backend} groups={args.groups} members={args.members} messages={args.messages} "
+          f"subscribers={args.subscribers} publishers={args.publishers}")
+    print(f"{'shards':>6}{'delivered':>16}{'misrouted':>11}{'unordered':>11}{'misplaced':>11}"
+          f"{'sends/s':>10}{'deliveries/s':>14}")
+    failed = False
+    for count in sorted(set(shards)):
+        result = run(args, args.hosts[:count])
+        misplaced = '-' if result['misplaced'] is None else result['misplaced']
+        print(
+            f"{count:>6}{result['received']:>8}/{result['expected']:<7}{result['misrouted']:>11}"
+            f"{result['out_of_order']:>11}{misplaced:>11}{result['sends_per_s']:>10,.0f}"
+            f"{result['deliveries_per_s']:>14,.0f}"
+        )
+        failed |= bool(result['received'] != result['expected'] or result['misrouted']
+                       or result['out_of_order'] or result['misplaced'])
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
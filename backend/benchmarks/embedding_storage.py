@@ -0,0 +1,127 @@
+"""
+Recall vs latency benchmark for embedding storage formats.
+
+Builds a synthetic corpus whose variance decays across dimensions, the way
+Matryoshka-trained embeddings front-load information, and compares exact
+float32 search against float16, truncated dimensions and binary
+quantization with re-ranking.
+
+    python benchmarks/embedding_storage.py --corpus 50000 --queries 200
+
+NumPy has no half-precision BLAS, so float16 latencies here overstate the
+cost; pgvector computes halfvec distances in float32 registers.
+"""
+import argparse
+import time
+import numpy as np
+
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def synthetic_corpus(rng, size, dims, clusters):
+    decay = 1.0 / np.sqrt(1.0 + np.arange(dims) / 32.0)
+    centers = rng.standard_normal((clusters, dims)) * decay
+    labels = rng.integers(0, clusters, size)
+    corpus = centers[labels] + 0.35 * rng.standard_normal((size, dims)) * decay
+    return normalize(corpus.astype(np.float32))
+
+
+def normalize(x):
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def top_k_l2(corpus, query, k):
+    # For unit vectors L2 order equals inner-product order
+    scores = corpus @ query
+    idx = np.argpartition(-scores, k)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+def hamming_top_k(bits, query_bits, k):
+    distances = POPCOUNT[np.bitwise_xor(bits, query_bits)].sum(axis=1, dtype=np.int32)
+    idx = np.argpartition(distances, k)[:k]
+    return idx[np.argsort(distances[idx])]
+
+
+def run(name, bytes_per_vector, search, queries, truth, k):
+    hits = 0
+    start = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        hits += len(set(search(query)) & set(expected))
+    elapsed = time.perf_counter() - start
+    return {
+        'format': name,
+        'bytes_per_vector': bytes_per_vector,
+        'recall': hits / (len(queries) * k),
+        'latency_ms': elapsed / len(queries) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--dims', type=int, default=1536)
+    parser.add_argument('--clusters', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--rerank', type=int, default=10, help='shortlist multiplier for binary re-ranking')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    corpus = synthetic_corpus(rng, args.corpus, args.dims, args.clusters)
+    picks = rng.integers(0, args.corpus, args.queries)
+    queries = normalize(corpus[picks] + 0.05 * rng.standard_normal((args.queries, args.dims)).astype(np.float32))
+    k = args.k
+    truth = [top_k_l2(corpus, q, k) for q in queries]
+
+    results = [run('float32', args.dims * 4, lambda q: top_k_l2(corpus, q, k), queries, truth, k)]
+
+    corpus16 = corpus.astype(np.float16)
+    results.append(run(
+        'float16', args.dims * 2,
+        lambda q: top_k_l2(corpus16, q.astype(np.float16), k), queries, truth, k
+    ))
+
+    for dims in (1024, 512, 256):
+        if dims >= args.dims:
+            continue
+        truncated = normalize(corpus[:, :dims])
+        results.append(run(
+            f'float32@{dims}', dims * 4,
+            lambda q, t=truncated, d=dims: top_k_l2(t, q[:d] / np.linalg.norm(q[:d]), k),
+            queries, truth, k
+        ))
+        truncated16 = truncated.astype(np.float16)
+        results.append(run(
+            f'float16@{dims}', dims * 2,
+            lambda q, t=truncated16, d=dims: top_k_l2(t, (q[:d] / np.linalg.norm(q[:d])).astype(np.float16), k),
+            queries, truth, k
+        ))
+
+    bits = np.packbits(corpus > 0, axis=1)
+    results.append(run(
+        'binary', bits.shape[1],
+        lambda q: hamming_top_k(bits, np.packbits(q > 0), k), queries, truth, k
+    ))
+
+    def binary_rerank(q):
+        shortlist = hamming_top_k(bits, np.packbits(q > 0), k * args.rerank)
+        return shortlist[top_k_l2(corpus[shortlist], q, k)]
+
+    # The index holds only the bits; full vectors are read for the shortlist
+    results.append(run(f'binary+rerank x{args.rerank}', bits.shape[1], binary_rerank, queries, truth, k))
+
+    baseline = args.dims * 4
+    print(f"corpus={args.corpus} dims={args.dims} queries={args.queries} k={k}")
+    print(f"{'format':<22}{'bytes/vec':>10}{'smaller':>9}{'recall@k':>10}{'ms/query':>10}")
+    for row in results:
+        print(
+            f"{row['format']:<22}{row['bytes_per_vector']:>10}"
+            f"{baseline / row['bytes_per_vector']:>8.1f}x"
+            f"{row['recall']:>10.3f}{row['latency_ms']:>10.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
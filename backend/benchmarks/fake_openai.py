@@ -0,0 +1,186 @@
+"""
+OpenAI-compatible fake provider for load tests.
+
+Serves /v1/chat/completions (streamed and not) and /v1/embeddings with
+configurable time-to-first-token, token rate and embedding latency, so
+runs are free, repeatable and isolate our own overhead from the
+provider's. Replies and vectors are deterministic for a given input.
+GET /stats reports request counts, including streams the client aborted.
+
+    python benchmarks/fake_openai.py --port 8100 --ttft 0.4 --token-rate 50
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=fake uvicorn core.asgi:application
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+
+WORDS = (
+    "the a to and of we you it is that for on with this can will should be "
+    "deploy release schedule report latency dashboard budget design review "
+    "cache index cluster backup roadmap feature customer team plan next week "
+    "agreed decided follow up check update issue fix test result option"
+).split()
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class FakeProvider:
+    def __init__(self, ttft=0.3, token_rate=50.0, reply_tokens=120, chat_latency=1.0,
+                 embedding_latency=0.05, dimensions=1536, jitter=0.2):
+        self.ttft = ttft
+        self.token_rate = token_rate
+        self.reply_tokens = reply_tokens
+        self.chat_latency = chat_latency
+        self.embedding_latency = embedding_latency
+        self.dimensions = dimensions
+        self.jitter = jitter
+        self.stats = {'chat': 0, 'streams': 0, 'aborted': 0, 'tokens': 0, 'embeddings': 0, 'inputs': 0}
+        self.rng = random.Random(0)
+
+    def _delay(self, seconds: float) -> float:
+        return max(seconds * (1 + self.rng.uniform(-self.jitter, self.jitter)), 0)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                await send({'type': message['type'] + '.complete'})
+                if message['type'] == 'lifespan.shutdown':
+                    return
+        if scope['type'] != 'http':
+            return
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        request = json.loads(body) if body else {}
+        path = scope['path']
+
+        if path.endswith('/chat/completions'):
+            if request.get('stream'):
+                await self.stream_chat(request, receive, send)
+            else:
+                await self.json(send, await self.chat(request))
+        elif path.endswith('/embeddings'):
+            await self.json(send, await self.embeddings(request))
+        elif path.endswith('/stats'):
+            await self.json(send, self.stats)
+        else:
+            await self.json(send, {'error': {'message': 'not found'}}, status=404)
+
+    async def json(self, send, payload, status=200):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': json.dumps(payload).encode()})
+
+    def reply(self, request):
+        prompt = json.dumps(request.get('messages', []))[-2000:]
+        rng = random.Random(_seed(prompt))
+        count = min(self.reply_tokens, request.get('max_tokens') or self.reply_tokens)
+        return [(' ' if i else '') + rng.choice(WORDS) for i in range(count)]
+
+    async def chat(self, request):
+        self.stats['chat'] += 1
+        tokens = self.reply(request)
+        await asyncio.sleep(self._delay(self.chat_latency))
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': ''.join(tokens)}}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': len(tokens), 'total_tokens': len(tokens)},
+        }
+
+    async def stream_chat(self, request, receive, send):
+        self.stats['streams'] += 1
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = request.get('model', 'fake')
+
+        def chunk(delta, finish_reason=None):
+            payload = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                       'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            return {'type': 'http.response.body', 'body': f"data: {json.dumps(payload)}\n\n".encode(),
+                    'more_body': True}
+
+        async def generate():
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': [(b'content-type', b'text/event-stream')]})
+            await asyncio.sleep(self._delay(self.ttft))
+            await send(chunk({'role': 'assistant', 'content': ''}))
+            for token in self.reply(request):
+                await send(chunk({'content': token}))
+                self.stats['tokens'] += 1
+                await asyncio.sleep(self._delay(1 / self.token_rate))
+            await send(chunk({}, 'stop'))
+            await send({'type': 'http.response.body', 'body': b"data: [DONE]\n\n"})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        generation = asyncio.create_task(generate())
+        watcher = asyncio.create_task(disconnected())
+        done, _ = await asyncio.wait({generation, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if generation not in done:
+            # The client closed the stream, as the app does on stop or disconnect
+            self.stats['aborted'] += 1
+            generation.cancel()
+        watcher.cancel()
+
+    async def embeddings(self, request):
+        inputs = request.get('input', [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self.stats['embeddings'] += 1
+        self.stats['inputs'] += len(inputs)
+        dimensions = request.get('dimensions') or self.dimensions
+        await asyncio.sleep(self._delay(self.embedding_latency))
+        data = []
+        for i, text in enumerate(inputs):
+            vector = np.random.default_rng(_seed(str(text))).standard_normal(dimensions).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            if request.get('encoding_format') == 'base64':
+                embedding = base64.b64encode(vector.tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({'object': 'embedding', 'index': i, 'embedding': embedding})
+        return {'object': 'list', 'data': data, 'model': request.get('model', 'fake'),
+                'usage': {'prompt_tokens': 0, 'total_tokens': 0}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--ttft', type=float, default=0.3, help='seconds before the first streamed token')
+    parser.add_argument('--token-rate', type=float, default=50, help='streamed tokens per second')
+    parser.add_argument('--reply-tokens', type=int, default=120)
+    parser.add_argument('--chat-latency', type=float, default=1.0, help='seconds for a non-streamed completion')
+    parser.add_argument('--embedding-latency', type=float, default=0.05)
+    parser.add_argument('--dimensions', type=int, default=1536)
+    parser.add_argument('--jitter', type=float, default=0.2, help='relative +/- spread of every delay')
+    args = parser.parse_args()
+
+    app = FakeProvider(args.ttft, args.token_rate, args.reply_tokens, args.chat_latency,
+                       args.embedding_latency, args.dimensions, args.jitter)
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning', backlog=4096)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Redis operations per AI reply when fanning tokens out to listeners.
+
+Simulates one reply published through the Redis channel layer to N
+listening sockets, each on its own channel layer instance as if served by
+a separate worker process, and counts the Redis commands and round trips
+issued by publisher and listeners together. Compares one group_send per
+token with the batched publishing ChatConsumer uses, including the
+replay-buffer XADDs.
+
+    REDIS_URL=redis://localhost:6379/0 python benchmarks/fanout.py --listeners 1 10
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+from channels_redis.core import RedisChannelLayer
+from redis import asyncio as aioredis
+from redis.asyncio.connection import Connection
+
+COUNTS = {'commands': 0, 'round_trips': 0}
+
+_pack_command = Connection.pack_command
+_send_packed_command = Connection.send_packed_command
+
+
+def _counting_pack_command(self, *args):
+    COUNTS['commands'] += 1
+    return _pack_command(self, *args)
+
+
+async def _counting_send_packed_command(self, command, check_health=True):
+    COUNTS['round_trips'] += 1
+    return await _send_packed_command(self, command, check_health)
+
+
+Connection.pack_command = _counting_pack_command
+Connection.send_packed_command = _counting_send_packed_command
+
+
+async def listen(layer, group, ready):
+    channel = await layer.new_channel()
+    await layer.group_add(group, channel)
+    ready.set()
+    frames = 0
+    while True:
+        message = await layer.receive(channel)
+        frames += 1
+        if message['type'] == 'llm_done':
+            return frames
+
+
+async def publish(layer, redis, group, tokens, rate, batch_tokens, batch_interval):
+    loop = asyncio.get_running_loop()
+    key = f"bench:reply:{uuid.uuid4()}"
+    pending = []
+    flushed_at = loop.time()
+
+    async def flush(seq):
+        nonlocal pending, flushed_at
+        if not pending:
+            return
+        text = "".join(pending)
+        await redis.xadd(key, {'event': 'token', 'seq': seq, 'count': len(pending), 'token': text},
+                         maxlen=4000, approximate=True)
+        await layer.group_send(group, {'type': 'llm_tokens', 'seq': seq, 'token': text})
+        pending = []
+        flushed_at = loop.time()
+
+    for seq in range(1, tokens + 1):
+        await asyncio.sleep(1 / rate)
+        pending.append(f"tok{seq} ")
+        if seq == 1 or len(pending) >= batch_tokens or loop.time() - flushed_at >= batch_interval:
+            await flush(seq)
+    await flush(tokens)
+    await layer.group_send(group, {'type': 'llm_done', 'seq': tokens})
+    await redis.delete(key)
+
+
+async def run(redis_url, listeners, tokens, rate, batch_tokens, batch_interval):
+    group = f"bench.{uuid.uuid4().hex}"
+    publisher = RedisChannelLayer(hosts=[redis_url])
+    redis = aioredis.Redis.from_url(redis_url)
+    layers = [RedisChannelLayer(hosts=[redis_url]) for _ in range(listeners)]
+    readies = [asyncio.Event() for _ in layers]
+    tasks = [asyncio.create_task(listen(layer, group, ready)) for layer, ready in zip(layers, readies)]
+    await asyncio.gather(*[ready.wait() for ready in readies])
+
+    COUNTS.update(commands=0, round_trips=0)
+    start = time.perf_counter()
+    await publish(publisher, redis, group, tokens, rate, batch_tokens, batch_interval)
+    frames = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    result = dict(COUNTS, frames=sum(frames) // listeners, seconds=elapsed)
+
+    for layer in layers + [publisher]:
+        await layer.flush()
+    await redis.aclose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', default=os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    parser.add_argument('--listeners', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--tokens', type=int, default=300)
+    parser.add_argument('--rate', type=float, default=100, help='tokens per second from the provider')
+    parser.add_argument('--batch-tokens', type=int, default=16)
+    parser.add_argument('--batch-interval', type=float, default=0.05)
+    args = parser.parse_args()
+
+    modes = [('per-token', 1, 0.0), ('batched', args.batch_tokens, args.batch_interval)]
+    print(f"tokens={args.tokens} rate={args.rate}/s")
+    print(f"{'mode':<11}{'listeners':>10}{'frames':>8}{'redis cmds':>12}{'round trips':>13}{'cmds/listener':>15}")
+    for listeners in args.listeners:
+        for name, batch_tokens, batch_interval in modes:
+            result = asyncio.run(run(
+                args.redis_url, listeners, args.tokens, args.rate, batch_tokens, batch_interval
+            ))
+            print(
+                f"{name:<11}{listeners:>10}{result['frames']:>8}{result['commands']:>12}"
+                f"{result['round_trips']:>13}{result['commands'] / listeners:>15.1f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
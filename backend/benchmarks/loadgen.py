@@ -0,0 +1,314 @@
+"""
+Load generator for the chat backend.
+
+Opens --connections WebSockets to ws/chat/<id>/, ramped over --ramp
+seconds, each on its own seeded conversation, and drives --turns
+conversation turns per socket with --think seconds between them. At the
+same time --http-workers loop over /api/conversations/, /api/ai/search/
+and /api/ai/query/. Reports p50/p95/p99 latency, throughput and errors per
+operation, plus CPU and peak RSS of the generator and of each --server-pid.
+
+Run against local Postgres and Redis with the provider faked:
+
+    python benchmarks/fake_openai.py --ttft 0.3 --token-rate 50 &
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=fake uvicorn core.asgi:application --port 8000 &
+    python manage.py seed_loadtest --users 200 --conversations 10 --output /tmp/loadtest.json
+    python benchmarks/loadgen.py --manifest /tmp/loadtest.json --connections 2000 \\
+        --server-pid $(pgrep -f "uvicorn core.asgi") --json /tmp/run.json
+
+Keep the fake provider's settings fixed between runs so differences come
+from the code under test.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+import numpy as np
+import websockets
+
+QUERIES = [
+    "what did we decide about the release schedule",
+    "who owns the database migration",
+    "latency dashboard follow up",
+    "budget review next steps",
+    "open incidents and alerts",
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    def observe(self, operation, seconds):
+        self.latencies[operation].append(seconds)
+
+    def error(self, operation, reason):
+        self.errors[(operation, reason)] += 1
+
+    def summary(self, elapsed):
+        rows = []
+        for operation in sorted(set(self.latencies) | {op for op, _ in self.errors}):
+            values = np.array(self.latencies.get(operation, []))
+            errors = sum(count for (op, _), count in self.errors.items() if op == operation)
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) if len(values) else (np.nan,) * 3
+            rows.append({
+                'operation': operation,
+                'count': int(len(values)),
+                'errors': errors,
+                'per_second': len(values) / elapsed if elapsed else 0.0,
+                'p50_ms': float(p50) * 1000,
+                'p95_ms': float(p95) * 1000,
+                'p99_ms': float(p99) * 1000,
+            })
+        return rows
+
+
+class ProcessSampler:
+    """CPU and RSS of processes from /proc, sampled once a second"""
+
+    def __init__(self, pids):
+        self.pids = pids
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.start = {}
+        self.peak_rss = defaultdict(int)
+
+    def _cpu(self, pid):
+        with open(f"/proc/{pid}/stat") as stat:
+            fields = stat.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.ticks
+
+    def _rss(self, pid):
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    async def run(self, stop):
+        self.started_at = time.perf_counter()
+        self.start = {pid: self._cpu(pid) for pid in self.pids}
+        while not stop.is_set():
+            for pid in self.pids:
+                self.peak_rss[pid] = max(self.peak_rss[pid], self._rss(pid))
+            try:
+                await asyncio.wait_for(stop.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started_at
+        rows = []
+        for pid in self.pids:
+            try:
+                cpu = self._cpu(pid) - self.start[pid]
+            except FileNotFoundError:
+                cpu = float('nan')
+            rows.append({'pid': pid, 'cpu_percent': 100 * cpu / elapsed, 'peak_rss_mb': self.peak_rss[pid] / 2 ** 20})
+        return rows
+
+
+async def chat_session(args, user, conversation_id, recorder, start_delay):
+    await asyncio.sleep(start_delay)
+    url = f"{args.ws_url.rstrip('/')}/ws/chat/{conversation_id}/"
+    headers = {'Cookie': f"{args.session_cookie}={user['sessionid']}"}
+    started = time.perf_counter()
+    try:
+        socket = await websockets.connect(url, extra_headers=headers, open_timeout=args.timeout,
+                                          ping_interval=None, max_size=None)
+    except Exception as e:
+        recorder.error('ws_connect', type(e).__name__)
+        return
+    recorder.observe('ws_connect', time.perf_counter() - started)
+    rng = random.Random(conversation_id)
+    try:
+        for turn in range(args.turns):
+            if turn:
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think)
+            await chat_turn(args, socket, rng, recorder)
+    except websockets.ConnectionClosed as e:
+        recorder.error('turn', f"closed {e.code}")
+    except Exception as e:
+        recorder.error('turn', type(e).__name__)
+    finally:
+        await socket.close()
+
+
+async def chat_turn(args, socket, rng, recorder):
+    sent_at = time.perf_counter()
+    temp_id = str(uuid.uuid4())
+    await socket.send(json.dumps({
+        'type': 'user_message',
+        'temp_id': temp_id,
+        'content': " ".join(rng.choice(QUERIES).split()[:rng.randint(3, 8)]),
+    }))
+    acked = first_token = False
+    deadline = sent_at + args.timeout
+    while True:
+        try:
+            frame = json.loads(await asyncio.wait_for(socket.recv(), deadline - time.perf_counter()))
+        except asyncio.TimeoutError:
+            recorder.error('turn', 'timeout')
+            return
+        kind = frame.get('type')
+        now = time.perf_counter()
+        if kind == 'message_ack' and frame.get('temp_id') == temp_id and not acked:
+            acked = True
+            recorder.observe('ack', now - sent_at)
+        elif kind == 'llm_token' and acked:
+            if not first_token:
+                first_token = True
+                recorder.observe('ttft', now - sent_at)
+        elif kind == 'llm_done' and acked:
+            recorder.observe('turn', now - sent_at)
+            # Frames carry batches of tokens; seq counts the tokens themselves
+            recorder.counters['tokens'] += frame.get('seq') or 0
+            if frame.get('truncated'):
+                recorder.error('turn', 'truncated')
+            return
+
+
+async def http_worker(args, client, users, recorder, stop):
+    rng = random.Random()
+    operations = [name for name, weight in args.http_mix.items() for _ in range(weight)]
+    while not stop.is_set():
+        user = rng.choice(users)
+        operation = rng.choice(operations)
+        cookies = {args.session_cookie: user['sessionid'], args.csrf_cookie: user['csrftoken']}
+        headers = {'X-CSRFToken': user['csrftoken']}
+        started = time.perf_counter()
+        try:
+            if operation == 'conversations':
+                response = await client.get('/api/conversations/', cookies=cookies)
+            elif operation == 'search':
+                response = await client.post('/api/ai/search/', cookies=cookies, headers=headers,
+                                             json={'query': rng.choice(QUERIES), 'limit': 10})
+            else:
+                response = await client.post('/api/ai/query/', cookies=cookies, headers=headers,
+                                             json={'query': rng.choice(QUERIES)})
+        except Exception as e:
+            recorder.error(f"http_{operation}", type(e).__name__)
+            continue
+        if response.status_code == 200:
+            recorder.observe(f"http_{operation}", time.perf_counter() - started)
+        else:
+            recorder.error(f"http_{operation}", str(response.status_code))
+
+
+def raise_fd_limit():
+    # Every socket is a file descriptor; the default soft limit is often 1024
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def run(args):
+    with open(args.manifest) as manifest:
+        seeded = json.load(manifest)
+    args.session_cookie = seeded['session_cookie']
+    args.csrf_cookie = seeded['csrf_cookie']
+    users = seeded['users']
+    # One socket per conversation: a new message supersedes a reply that is
+    # still streaming in the same conversation
+    sockets = [(user, conversation) for user in users for conversation in user['conversations']]
+    if len(sockets) < args.connections:
+        raise SystemExit(f"Manifest has {len(sockets)} active conversations; seed more for {args.connections} connections")
+    sockets = sockets[:args.connections]
+
+    recorder = Recorder()
+    stop = asyncio.Event()
+    sampler = ProcessSampler([os.getpid()] + args.server_pid)
+    sampling = asyncio.create_task(sampler.run(stop))
+    limits = httpx.Limits(max_connections=args.http_workers, max_keepalive_connections=args.http_workers)
+    async with httpx.AsyncClient(base_url=args.http_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        workers = [asyncio.create_task(http_worker(args, client, users, recorder, stop))
+                   for _ in range(args.http_workers)]
+        step = args.ramp / len(sockets) if sockets else 0
+        sessions = [
+            asyncio.create_task(chat_session(args, user, conversation, recorder, i * step))
+            for i, (user, conversation) in enumerate(sockets)
+        ]
+        if sessions:
+            _, pending = await asyncio.wait(sessions, timeout=args.duration or None)
+        else:
+            pending = set()
+            await asyncio.sleep(args.duration)
+        for task in pending:
+            task.cancel()
+        stop.set()
+        await asyncio.gather(*workers, *pending, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+    await sampling
+
+    return {
+        'connections': len(sockets),
+        'turns_per_connection': args.turns,
+        'elapsed_s': elapsed,
+        'tokens_per_second': recorder.counters['tokens'] / elapsed,
+        'operations': recorder.summary(elapsed),
+        'errors': [{'operation': op, 'reason': reason, 'count': count}
+                   for (op, reason), count in sorted(recorder.errors.items())],
+        'processes': sampler.summary(),
+    }
+
+
+def report(result):
+    print(f"connections={result['connections']} turns/connection={result['turns_per_connection']} "
+          f"elapsed={result['elapsed_s']:.1f}s tokens/s={result['tokens_per_second']:,.0f}")
+    print(f"{'operation':<20}{'count':>8}{'errors':>8}{'per s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in result['operations']:
+        print(f"{row['operation']:<20}{row['count']:>8}{row['errors']:>8}{row['per_second']:>9.1f}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+    for error in result['errors']:
+        print(f"  error {error['operation']}: {error['reason']} x{error['count']}")
+    print(f"{'pid':>8}{'cpu %':>9}{'peak rss MB':>13}")
+    for row in result['processes']:
+        print(f"{row['pid']:>8}{row['cpu_percent']:>9.1f}{row['peak_rss_mb']:>13.1f}")
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('conversations', 'search', 'query'):
+            raise argparse.ArgumentTypeError(f"unknown operation {name}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--manifest', default='loadtest.json', help='written by manage.py seed_loadtest')
+    parser.add_argument('--http-url', default='http://localhost:8000')
+    parser.add_argument('--ws-url', default='ws://localhost:8000')
+    parser.add_argument('--connections', type=int, default=100)
+    parser.add_argument('--ramp', type=float, default=10, help='seconds over which sockets are opened')
+    parser.add_argument('--turns', type=int, default=3)
+    parser.add_argument('--think', type=float, default=2, help='mean seconds between turns')
+    parser.add_argument('--http-workers', type=int, default=10)
+    parser.add_argument('--http-mix', type=parse_mix, default=parse_mix('conversations=6,search=3,query=1'))
+    parser.add_argument('--duration', type=float, default=0, help='stop after this many seconds')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--server-pid', type=int, nargs='*', default=[])
+    parser.add_argument('--json', help='also write the results here')
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    result = asyncio.run(run(args))
+    report(result)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(result, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Throughput benchmark for the local sentiment and key-point engine.
+
+Generates synthetic chat messages and reports messages per second for
+sentiment scoring and for TextRank key-point extraction at several
+conversation sizes.
+
+    python benchmarks/local_analysis.py --sizes 100 1000 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_module.local_analysis import LEXICON, LocalAnalyzer  # noqa: E402
+
+FILLER = (
+    "the deploy pipeline database migration release schedule customer report "
+    "api latency dashboard budget meeting design review onboarding invoice "
+    "search index cache cluster backup sprint roadmap feature request"
+).split()
+CUES = ["we decided to", "I will", "we need to", "let's follow up on", "maybe", "also"]
+
+
+def synthetic_messages(rng, count):
+    words = FILLER + list(LEXICON) + ['not', 'very', 'really']
+    messages = []
+    for _ in range(count):
+        sentences = []
+        for _ in range(rng.randint(1, 3)):
+            body = " ".join(rng.choice(words) for _ in range(rng.randint(6, 18)))
+            sentences.append(f"{rng.choice(CUES)} {body}.")
+        messages.append(" ".join(sentences))
+    return messages
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    analyzer = LocalAnalyzer()
+    print(f"{'messages':>10}{'sentiment msg/s':>18}{'key points msg/s':>19}")
+    for size in args.sizes:
+        texts = synthetic_messages(rng, size)
+        sentiment = timed(lambda: analyzer.conversation_sentiment(analyzer.message_sentiment(texts)), args.repeat)
+        key_points = timed(lambda: analyzer.key_points(texts), args.repeat)
+        print(f"{size:>10}{size / sentiment:>18,.0f}{size / key_points:>19,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Startup time and memory per worker of the production server.
+
+Starts gunicorn with gunicorn.conf.py and --workers N in each mode
+(preload_app on and off) and reports:
+
+- ready: seconds from launch until every worker finished lifespan startup
+- first/median request: latency of the first request once ready and the
+  median of the following --requests, to show what the first caller pays
+- RSS, PSS and USS of the master and of each worker from smaps_rollup.
+  PSS splits shared pages between the processes sharing them and USS
+  counts only a process's private pages, so preloading shows up as a
+  lower USS and total PSS per worker rather than a lower RSS
+- stop: seconds from SIGTERM until the master exited, including the drain
+
+    python benchmarks/startup.py --workers 4 --json /tmp/startup.json
+
+Point it at the usual database and Redis for representative warm-up
+times; if they are missing the warm-up logs a warning and the run goes on.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READY_LINE = 'Application startup complete'
+MODES = {'preload': 'True', 'no-preload': 'False'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def memory(pid):
+    """RSS, PSS and USS of a process in bytes"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as listing:
+        return [int(child) for child in listing.read().split()]
+
+
+def run_mode(args, mode):
+    port = free_port()
+    env = dict(os.environ, PRELOAD_APP=MODES[mode])
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'core.asgi:application', '-c', 'gunicorn.conf.py',
+         '--workers', str(args.workers), '--bind', f"127.0.0.1:{port}"],
+        cwd=BACKEND, env=env, stderr=subprocess.PIPE, text=True
+    )
+    ready_at = []
+    all_ready = threading.Event()
+    log = []
+
+    def follow():
+        for line in server.stderr:
+            log.append(line)
+            if READY_LINE in line:
+                ready_at.append(time.perf_counter() - started)
+                if len(ready_at) == args.workers:
+                    all_ready.set()
+
+    threading.Thread(target=follow, daemon=True).start()
+    try:
+        if not all_ready.wait(args.timeout):
+            raise SystemExit(f"{mode}: workers not ready after {args.timeout}s\n" + "".join(log[-20:]))
+
+        latencies = []
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            for _ in range(args.requests + 1):
+                request_started = time.perf_counter()
+                client.get(args.path).raise_for_status()
+                latencies.append(time.perf_counter() - request_started)
+
+        master = memory(server.pid)
+        workers = [memory(pid) for pid in children(server.pid)]
+    finally:
+        stopping = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(args.timeout)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+        stopped = time.perf_counter() - stopping
+
+    def average(key):
+        return statistics.mean(worker[key] for worker in workers) if workers else 0
+
+    return {
+        'mode': mode,
+        'workers': len(workers),
+        'first_ready_s': ready_at[0],
+        'ready_s': ready_at[-1],
+        'first_request_ms': latencies[0] * 1000,
+        'median_request_ms': statistics.median(latencies[1:]) * 1000 if args.requests else float('nan'),
+        'master_rss_mb': master['rss'] / 2 ** 20,
+        'worker_rss_mb': average('rss') / 2 ** 20,
+        'worker_pss_mb': average('pss') / 2 ** 20,
+        'worker_uss_mb': average('uss') / 2 ** 20,
+        'total_pss_mb': (master['pss'] + sum(worker['pss'] for worker in workers)) / 2 ** 20,
+        'stop_s': stopped,
+    }
+
+
+def report(results):
+    columns = [
+        ('mode', 'mode', '<12', ''), ('workers', 'workers', '>8', 'd'),
+        ('first_ready_s', 'first s', '>9', '.2f'), ('ready_s', 'ready s', '>9', '.2f'),
+        ('first_request_ms', 'first ms', '>10', '.1f'), ('median_request_ms', 'median ms', '>11', '.1f'),
+        ('master_rss_mb', 'master RSS', '>12', '.1f'), ('worker_rss_mb', 'RSS/w', '>8', '.1f'),
+        ('worker_pss_mb', 'PSS/w', '>8', '.1f'), ('worker_uss_mb', 'USS/w', '>8', '.1f'),
+        ('total_pss_mb', 'total PSS', '>11', '.1f'), ('stop_s', 'stop s', '>8', '.2f'),
+    ]
+    print("".join(f"{title:{align}}" for _, title, align, _ in columns) + "   (MB)")
+    for result in results:
+        print("".join(f"{result[key]:{align}{spec}}" for key, _, align, spec in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', default=','.join(MODES), help='comma-separated: ' + ', '.join(MODES))
+    parser.add_argument('--repeat', type=int, default=3, help='runs per mode; the median run is reported')
+    parser.add_argument('--requests', type=int, default=50, help='requests after the first one')
+    parser.add_argument('--path', default='/')
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--json', help='also write the results here')
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes.split(','):
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode}")
+        runs = sorted((run_mode(args, mode) for _ in range(args.repeat)), key=lambda run: run['ready_s'])
+        results.append(runs[len(runs) // 2])
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
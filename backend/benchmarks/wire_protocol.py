@@ -0,0 +1,123 @@
+"""
+Bytes on the wire and encode CPU per AI reply for each WebSocket encoding.
+
+Replays the frames a client receives over one chat turn: the ack, typing
+updates from another participant, the reply as the consumer batches it
+(the first token alone, then --batch tokens per frame) and llm_done with
+the full text. Each frame is encoded as JSON text or MessagePack, then
+optionally compressed the way permessage-deflate does it: one zlib stream
+per socket, flushed per message, so later frames reuse the earlier ones'
+context. Wire bytes include the WebSocket frame header.
+
+    python benchmarks/wire_protocol.py --tokens 300 --batch 16
+
+The deflate rows are uvicorn's default settings and the ones core.workers
+uses; "state" is zlib's compressor memory per socket for each.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat import protocol  # noqa: E402
+
+WORDS = (
+    "the a to and of we you it is that for on with this can will should be "
+    "deploy release schedule report latency dashboard budget design review "
+    "cache index cluster backup roadmap feature customer team plan next week"
+).split()
+
+# (label, window bits, memLevel); None for no compression
+COMPRESSION = [
+    ('none', None, None),
+    ('deflate 15/8', 15, 8),
+    ('deflate 12/5', 12, 5),
+]
+
+
+def reply_frames(tokens, batch, seed=0):
+    """Frames a client receives during one turn, as the consumer sends them"""
+    rng = random.Random(seed)
+    message_id, reply_id = str(uuid.uuid4()), str(uuid.uuid4())
+    timestamp = datetime.now(timezone.utc).isoformat()
+    words = [(' ' if i else '') + rng.choice(WORDS) for i in range(tokens)]
+    frames = [
+        {'type': 'typing_indicator', 'user_id': '42', 'is_typing': True},
+        {'type': 'typing_indicator', 'user_id': '42', 'is_typing': False},
+        {'type': 'message_ack', 'temp_id': str(uuid.uuid4()), 'message_id': message_id, 'timestamp': timestamp},
+    ]
+    seq = 0
+    for start, end in [(0, 1)] + [(i, min(i + batch, tokens)) for i in range(1, tokens, batch)]:
+        seq = end
+        frames.append({'type': 'llm_token', 'message_id': reply_id, 'seq': seq,
+                       'token': ''.join(words[start:end]), 'done': False})
+    frames.append({'type': 'llm_done', 'message_id': reply_id, 'seq': seq, 'text': ''.join(words),
+                   'truncated': False})
+    return frames
+
+
+def frame_header(length):
+    # Server frames are unmasked
+    return 2 if length < 126 else 4 if length < 65536 else 10
+
+
+def deflate_state(window_bits, mem_level):
+    # zlib.h: deflate needs (1 << (windowBits + 2)) + (1 << (memLevel + 9)) bytes
+    return (1 << (window_bits + 2)) + (1 << (mem_level + 9))
+
+
+def send_reply(codec, frames, window_bits=None, mem_level=None):
+    """Wire bytes of one reply over a fresh socket"""
+    compressor = None
+    if window_bits is not None:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -window_bits, mem_level)
+    total = 0
+    for frame in frames:
+        data = codec.encode(frame)
+        if not codec.binary:
+            data = data.encode('utf-8')
+        if compressor is not None:
+            data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            # permessage-deflate drops the flush marker from each message
+            data = data[:-4]
+        total += frame_header(len(data)) + len(data)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=300, help='tokens per reply')
+    parser.add_argument('--batch', type=int, default=16, help='tokens per frame after the first, as STREAM_BATCH_TOKENS')
+    parser.add_argument('--repeat', type=int, default=200, help='replies encoded per timing')
+    args = parser.parse_args()
+
+    if protocol.msgpack is None:
+        raise SystemExit("pip install msgpack")
+    frames = reply_frames(args.tokens, args.batch)
+    print(f"{len(frames)} frames per reply, {args.tokens} tokens, batch {args.batch}")
+    print(f"{'encoding':<10}{'compression':<15}{'bytes/reply':>12}{'vs json':>9}{'us/reply':>10}{'state KB':>10}")
+    baseline = None
+    for codec in (protocol.JSON, protocol.MSGPACK):
+        for label, window_bits, mem_level in COMPRESSION:
+            size = send_reply(codec, frames, window_bits, mem_level)
+            baseline = baseline or size
+            timings = []
+            for _ in range(5):
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    send_reply(codec, frames, window_bits, mem_level)
+                timings.append((time.perf_counter() - started) / args.repeat)
+            state = deflate_state(window_bits, mem_level) / 1024 if window_bits else 0
+            print(f"{codec.name:<10}{label:<15}{size:>12,}{size / baseline:>9.0%}"
+                  f"{statistics.median(timings) * 1e6:>10.1f}{state:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
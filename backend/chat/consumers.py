@@ -1,20 +1,63 @@
-import json
+import time
 import uuid
+import asyncio
+from contextlib import aclosing
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.db import transaction
+from analytics import rollups
 from .models import Conversation, Message
+from . import protocol
+from .streams import ReplayBuffer, conversation_group, EVENT_DONE, EVENT_TOKEN
 from ai_module.services import AIService
+from core import metrics
+
+# In-flight replies by task, including ones that outlived their socket
+# while waiting for a resume; drained when the server shuts down
+generations = {}
+
+
+async def drain_generations(timeout: float):
+    """
+    Let in-flight replies finish for up to `timeout` seconds, then stop the
+    rest so their partial text is saved. On shutdown the server closes every
+    socket first; clients reconnect to another worker and follow the reply
+    from the replay buffer while it completes here.
+    """
+    if not generations:
+        return
+    _, pending = await asyncio.wait(list(generations), timeout=timeout)
+    await asyncio.gather(
+        *(generations[task].cancel_generation('shutdown') for task in pending if task in generations),
+        return_exceptions=True
+    )
 
 class ChatConsumer(AsyncWebsocketConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.conversation_id = None
+        self.group_name = None
         self.user = None
         self.ai_service = AIService()
+        self.generation_task = None
+        self.stop_reason = None
+        self.resume_task = None
+        self.presence_task = None
+        self.reply_id = None
+        self.connected = False
+        self.codec = protocol.JSON
+        self.replay_buffer = None
+        self.held_reply = None
+        self.held_events = []
+        self.typing_state = False
+        self.typing_sent_at = 0.0
 
     async def connect(self):
         self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
+        self.group_name = conversation_group(self.conversation_id)
         self.user = self.scope['user']
         
         if isinstance(self.user, AnonymousUser):
@@ -27,55 +70,160 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return
 
         await self.channel_layer.group_add(
-            self.conversation_id,
+            self.group_name,
             self.channel_name
         )
-        await self.accept()
+        self.codec, subprotocol = protocol.negotiate(self.scope)
+        await self.accept(subprotocol)
+        self.connected = True
+        self.replay_buffer = ReplayBuffer(self.conversation_id)
+        await self.replay_buffer.join(self.channel_name)
+        self.presence_task = asyncio.create_task(self.refresh_presence())
+        
+        # Let a reconnecting client know a reply it may have missed is
+        # still being generated, so it resumes instead of re-sending. Live
+        # frames for that reply are held until the replay has been sent so
+        # the client sees tokens in sequence order.
+        active_reply = await self.replay_buffer.active_reply()
+        if active_reply:
+            self.held_reply = active_reply
+            self.resume_task = asyncio.create_task(self.release_held_after_timeout())
+            await self.send_message({
+                'type': 'stream_active',
+                'message_id': active_reply
+            })
 
     async def disconnect(self, close_code):
+        if not self.connected:
+            return
+        self.connected = False
+        if self.resume_task:
+            self.resume_task.cancel()
+        self.presence_task.cancel()
+        await self.replay_buffer.leave(self.channel_name)
+        
+        # The reply is shared with every socket in the conversation, so keep
+        # generating for a grace period in which a reconnecting client can
+        # pick it up, then stop paying for tokens nobody will read
+        task = self.generation_task
+        if task and not task.done():
+            watchdog = asyncio.create_task(self.cancel_without_listeners())
+            task.add_done_callback(lambda _: watchdog.cancel())
+        
         if self.conversation_id:
             await self.channel_layer.group_discard(
-                self.conversation_id,
+                self.group_name,
                 self.channel_name
             )
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        message_type = data.get('type')
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = protocol.decode(text_data, bytes_data)
+        except protocol.ProtocolError as e:
+            await self.send_message({'type': 'error', 'error': str(e)})
+            return
+        message_type = data['type']
         
         if message_type == 'user_message':
             await self.handle_user_message(data)
         elif message_type == 'typing_indicator':
             await self.handle_typing_indicator(data)
+        elif message_type == 'stop_generation':
+            await self.stop_generation(data)
+        elif message_type == 'resume':
+            await self.resume_stream(data.get('message_id') or '', data.get('last_seq', 0))
 
     async def handle_user_message(self, data):
         content = data.get('content', '').strip()
-        temp_id = data.get('temp_id', str(uuid.uuid4()))
+        temp_id = data.get('temp_id') or str(uuid.uuid4())
         
         if not content:
             return
+        turn_started = time.perf_counter()
+
+        # Stop the in-flight reply and wait for its partial save first, so
+        # it sorts before the new question in the history sent as the prompt
+        await self.cancel_generation('superseded')
 
         # Save user message
-        user_message = await self.save_message(
-            sender=Message.SENDER_USER,
-            content=content,
-            metadata=data.get('metadata', {})
-        )
+        with metrics.timed(metrics.CHAT_TURN_SECONDS, 'save_message', span='chat.save_message'):
+            user_message = await self.save_message(
+                sender=Message.SENDER_USER,
+                content=content,
+                metadata=data.get('metadata')
+            )
 
         # Send acknowledgment
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'message_ack',
             'temp_id': temp_id,
             'message_id': str(user_message.id),
             'timestamp': user_message.timestamp.isoformat()
-        }))
+        })
+        
+        # Other tabs and devices in the conversation
+        with metrics.timed(metrics.CHAT_TURN_SECONDS, 'broadcast', span='chat.broadcast'):
+            await self.channel_layer.group_send(self.group_name, {
+                'type': 'chat_message',
+                'sender_channel': self.channel_name,
+                'message_id': str(user_message.id),
+                'sender': user_message.sender,
+                'content': user_message.content,
+                'timestamp': user_message.timestamp.isoformat()
+            })
 
-        # Stream AI response
-        await self.stream_ai_response(user_message)
+        # Stream AI response in a task so stop_generation and disconnects are
+        # handled while tokens are still arriving
+        self.stop_reason = None
+        task = self.generation_task = asyncio.create_task(self.stream_ai_response(user_message, turn_started))
+        generations[task] = self
+        task.add_done_callback(lambda _: generations.pop(task, None))
 
-    async def stream_ai_response(self, user_message):
-        conversation = await self.get_conversation()
-        messages = await self.get_conversation_messages()
+    async def cancel_generation(self, reason):
+        """Cancel the in-flight reply and wait for its partial save"""
+        task = self.generation_task
+        if task is None or task.done():
+            return
+        self.stop_reason = reason
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def stop_generation(self, data):
+        if self.generation_task and not self.generation_task.done():
+            await self.cancel_generation('user')
+            return
+        # The reply may be owned by another socket of this conversation, or
+        # by one that dropped, whose detached task polls for the flag. Only
+        # this conversation's active reply can be stopped from here.
+        message_id = await self.replay_buffer.active_reply()
+        if message_id is None or data.get('message_id') not in (None, '', message_id):
+            return
+        await self.replay_buffer.mark(message_id, 'stop')
+        await self.channel_layer.group_send(self.group_name, {
+            'type': 'generation_stop',
+            'message_id': message_id
+        })
+
+    async def cancel_without_listeners(self):
+        # Runs until the reply finishes (the done callback cancels it), so a
+        # reply kept alive for other sockets stops once they are gone too
+        await asyncio.sleep(settings.STREAM_RESUME_GRACE)
+        while await self.replay_buffer.listeners() > 0:
+            await asyncio.sleep(settings.STREAM_PRESENCE_INTERVAL)
+        await self.cancel_generation('disconnect')
+
+    async def refresh_presence(self):
+        while True:
+            await asyncio.sleep(settings.STREAM_PRESENCE_INTERVAL)
+            await self.replay_buffer.join(self.channel_name)
+
+    async def stream_ai_response(self, user_message, turn_started):
+        with metrics.timed(metrics.CHAT_TURN_SECONDS, 'history', span='chat.history'):
+            conversation = await self.get_conversation()
+            messages = await self.get_conversation_messages()
         
         # Convert to AI service format
         ai_messages = [
@@ -86,46 +234,228 @@ class ChatConsumer(AsyncWebsocketConsumer):
             for msg in messages
         ]
         
-        # Stream response
+        # Stream response. Closing the generator on cancellation closes the
+        # upstream HTTP stream right away. Tokens are published once to the
+        # conversation group, batched by count and time, and each batch is
+        # mirrored to the replay buffer under the sequence number of its
+        # last token.
+        reply_id = self.reply_id = str(uuid.uuid4())
+        await self.replay_buffer.start(reply_id)
+        loop = asyncio.get_running_loop()
         full_response = ""
-        async for token in self.ai_service.stream_chat_completion(ai_messages):
-            full_response += token
-            await self.send(text_data=json.dumps({
-                'type': 'llm_token',
-                'token': token,
-                'done': False
-            }))
-        
-        # Save AI message
-        ai_message = await self.save_message(
-            sender=Message.SENDER_AI,
-            content=full_response,
-            tokens=len(full_response.split())  # Rough estimate
-        )
+        seq = 0
+        pending = []
+        flushed_at = loop.time()
+        truncated = False
+        
+        async def flush():
+            nonlocal pending, flushed_at
+            if not pending:
+                return False
+            text, count = "".join(pending), len(pending)
+            pending = []
+            flushed_at = loop.time()
+            if seq == count:
+                metrics.CHAT_TURN_SECONDS.labels('first_token').observe(time.perf_counter() - turn_started)
+            with metrics.timed(metrics.CHAT_TURN_SECONDS, 'publish'):
+                stop_requested = await self.replay_buffer.append(
+                    reply_id, seq, text, count, check_stop=not self.connected
+                )
+                await self.channel_layer.group_send(self.group_name, {
+                    'type': 'llm_tokens',
+                    'message_id': reply_id,
+                    'seq': seq,
+                    'token': text
+                })
+            return stop_requested
+        
+        try:
+            with metrics.timed(metrics.CHAT_TURN_SECONDS, 'generate', span='chat.generate'):
+                async with aclosing(self.ai_service.stream_chat_completion(ai_messages)) as stream:
+                    async for token in stream:
+                        full_response += token
+                        seq += 1
+                        pending.append(token)
+                        # The first token goes out alone to keep time-to-first-token low
+                        if (seq == 1 or len(pending) >= settings.STREAM_BATCH_TOKENS
+                                or loop.time() - flushed_at >= settings.STREAM_BATCH_INTERVAL):
+                            if await flush():
+                                self.stop_reason = 'user'
+                                raise asyncio.CancelledError()
+            await flush()
+        except asyncio.CancelledError:
+            truncated = True
+            await flush()
+        
+        # Save AI message, keeping whatever was generated before a stop
+        if full_response:
+            with metrics.timed(metrics.CHAT_TURN_SECONDS, 'save_reply', span='chat.save_reply'):
+                await self.save_message(
+                    message_id=reply_id,
+                    sender=Message.SENDER_AI,
+                    content=full_response,
+                    metadata={'truncated': True, 'stop_reason': self.stop_reason} if truncated else None,
+                    tokens=len(full_response.split())  # Rough estimate
+                )
+        await self.replay_buffer.finish(reply_id, seq, truncated)
         
-        await self.send(text_data=json.dumps({
+        if full_response:
+            await self.channel_layer.group_send(self.group_name, {
+                'type': 'llm_done',
+                'message_id': reply_id,
+                'seq': seq,
+                'text': full_response,
+                'truncated': truncated
+            })
+        metrics.CHAT_TURN_SECONDS.labels('total').observe(time.perf_counter() - turn_started)
+        
+        if truncated:
+            raise asyncio.CancelledError()
+
+    async def resume_stream(self, message_id, last_seq):
+        """Replay tokens after `last_seq` of a reply; live frames follow via the group"""
+        entries = await self.replay_buffer.read(message_id)
+        if not entries:
+            # Buffer expired; a finished reply can still be served from the DB
+            message = await self.get_message(message_id)
+            if message is None:
+                await self.send_message({'type': 'resume_failed', 'message_id': message_id})
+            else:
+                await self.send_done(message_id, None, message.content, message.metadata.get('truncated', False))
+            await self.release_held(message_id, None, True)
+            return
+        
+        tokens = [entry for entry in entries if entry['event'] == EVENT_TOKEN]
+        if tokens and int(tokens[0]['seq']) - int(tokens[0]['count']) >= last_seq + 1:
+            # Trimmed past what the client has; replay what is left from
+            # scratch so the client can rebuild the reply
+            last_seq = 0
+            await self.send_message({'type': 'resume_reset', 'message_id': message_id})
+        
+        replayed = last_seq
+        done = False
+        for entry in entries:
+            seq = int(entry['seq'])
+            if entry['event'] == EVENT_TOKEN and seq > last_seq:
+                await self.send_token(message_id, seq, entry['token'])
+                replayed = seq
+            elif entry['event'] == EVENT_DONE:
+                message = await self.get_message(message_id)
+                await self.send_done(message_id, seq, message.content if message else '', bool(int(entry['truncated'])))
+                done = True
+        await self.release_held(message_id, replayed, done)
+
+    async def release_held(self, message_id, replayed, done):
+        """Send live frames held since connect that the replay did not cover"""
+        if self.held_reply is None or self.held_reply != message_id:
+            return
+        held, self.held_reply, self.held_events = self.held_events, None, []
+        if self.resume_task:
+            self.resume_task.cancel()
+            self.resume_task = None
+        for event in held:
+            if event['type'] == 'llm_done':
+                if not done:
+                    await self.dispatch(event)
+            elif replayed is None or event['seq'] > replayed:
+                await self.dispatch(event)
+
+    async def release_held_after_timeout(self):
+        # Clients that never resume still get the live tail
+        await asyncio.sleep(settings.STREAM_RESUME_HOLD)
+        self.resume_task = None
+        await self.release_held(self.held_reply, None, False)
+
+    async def send_token(self, message_id, seq, token):
+        await self.send_message({
+            'type': 'llm_token',
+            'message_id': message_id,
+            'seq': seq,
+            'token': token,
+            'done': False
+        })
+
+    async def send_done(self, message_id, seq, text, truncated):
+        await self.send_message({
             'type': 'llm_done',
-            'message_id': str(ai_message.id),
-            'text': full_response
-        }))
+            'message_id': message_id,
+            'seq': seq,
+            'text': text,
+            'truncated': truncated
+        })
+
+    async def send_message(self, message):
+        data = self.codec.encode(message)
+        if self.codec.binary:
+            await self.send(bytes_data=data)
+        else:
+            await self.send(text_data=data)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        # Slow clients show up here as WebSocket backpressure
+        with metrics.timed(metrics.WEBSOCKET_SEND_SECONDS):
+            await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+    def hold(self, event):
+        if self.held_reply and event['message_id'] == self.held_reply:
+            self.held_events.append(event)
+            return True
+        return False
+
+    async def llm_tokens(self, event):
+        if not self.hold(event):
+            await self.send_token(event['message_id'], event['seq'], event['token'])
+
+    async def llm_done(self, event):
+        if not self.hold(event):
+            await self.send_done(event['message_id'], event['seq'], event['text'], event['truncated'])
+
+    async def chat_message(self, event):
+        if event['sender_channel'] == self.channel_name:
+            return
+        await self.send_message({
+            'type': 'chat_message',
+            'message_id': event['message_id'],
+            'sender': event['sender'],
+            'content': event['content'],
+            'timestamp': event['timestamp']
+        })
+
+    async def generation_stop(self, event):
+        if self.reply_id == event['message_id']:
+            await self.cancel_generation('user')
 
     async def handle_typing_indicator(self, data):
-        is_typing = data.get('is_typing', False)
+        is_typing = bool(data.get('is_typing', False))
+        
+        # Clients report typing on every keystroke; forward state changes
+        # and refresh an ongoing "typing" at most every TYPING_THROTTLE
+        now = asyncio.get_running_loop().time()
+        if is_typing == self.typing_state and (
+            not is_typing or now - self.typing_sent_at < settings.TYPING_THROTTLE
+        ):
+            return
+        self.typing_state = is_typing
+        self.typing_sent_at = now
+        
         await self.channel_layer.group_send(
-            self.conversation_id,
+            self.group_name,
             {
                 'type': 'typing_indicator',
+                'sender_channel': self.channel_name,
                 'user_id': str(self.user.id),
                 'is_typing': is_typing
             }
         )
 
     async def typing_indicator(self, event):
-        await self.send(text_data=json.dumps({
+        if event.get('sender_channel') == self.channel_name:
+            return
+        await self.send_message({
             'type': 'typing_indicator',
             'user_id': event['user_id'],
             'is_typing': event['is_typing']
-        }))
+        })
 
     @database_sync_to_async
     def verify_conversation_access(self):
@@ -147,11 +477,22 @@ class ChatConsumer(AsyncWebsocketConsumer):
         return list(Message.objects.filter(conversation_id=self.conversation_id).order_by('timestamp'))
 
     @database_sync_to_async
-    def save_message(self, sender, content, metadata=None, tokens=None):
-        return Message.objects.create(
-            conversation_id=self.conversation_id,
-            sender=sender,
-            content=content,
-            metadata=metadata or {},
-            tokens=tokens
-        )
\ No newline at end of file
+    def get_message(self, message_id):
+        try:
+            return Message.objects.get(id=message_id, conversation_id=self.conversation_id)
+        except (Message.DoesNotExist, ValueError, ValidationError):
+            return None
+
+    @database_sync_to_async
+    def save_message(self, sender, content, metadata=None, tokens=None, message_id=None):
+        with transaction.atomic():
+            message = Message.objects.create(
+                id=message_id or uuid.uuid4(),
+                conversation_id=self.conversation_id,
+                sender=sender,
+                content=content,
+                metadata=metadata or {},
+                tokens=tokens
+            )
+            rollups.record_message(self.user.id, message)
+        return message
\ No newline at end of file
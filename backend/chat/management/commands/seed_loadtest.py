@@ -0,0 +1,120 @@
+import json
+import random
+from datetime import timedelta
+from importlib import import_module
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from ai_module import embeddings as embedding_storage
+from analytics import rollups
+from chat.models import Conversation, Message
+
+USERNAME_PREFIX = 'loadtest-'
+
+WORDS = (
+    "deploy release schedule report latency dashboard budget meeting design review "
+    "onboarding invoice search index cache cluster backup sprint roadmap feature "
+    "customer migration database api incident alert plan decided agreed follow up"
+).split()
+
+
+class Command(BaseCommand):
+    help = "Create users, sessions and conversations for benchmarks/loadgen.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--conversations', type=int, default=10,
+                            help='active conversations per user, one per load-test socket')
+        parser.add_argument('--history', type=int, default=20, help='ended conversations per user')
+        parser.add_argument('--messages', type=int, default=20, help='messages per ended conversation')
+        parser.add_argument('--output', default='loadtest.json', help='manifest for the load generator')
+        parser.add_argument('--clear', action='store_true', help='delete earlier load-test users first')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+            self.stdout.write(f"Deleted {deleted} rows from earlier runs")
+
+        rng = random.Random(options['seed'])
+        vectors = np.random.default_rng(options['seed'])
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        users = []
+        for i in range(options['users']):
+            with transaction.atomic():
+                user, _ = User.objects.get_or_create(username=f"{USERNAME_PREFIX}{i}")
+                active = Conversation.objects.bulk_create([
+                    Conversation(title=f"Load test {n}", created_by=user, participants=[user.username])
+                    for n in range(options['conversations'])
+                ])
+                ended = self.create_history(user, options['history'], options['messages'], rng, vectors)
+
+            # Log the user in the way the auth middleware reads it back
+            session = session_store()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            users.append({
+                'username': user.username,
+                'sessionid': session.session_key,
+                'csrftoken': get_random_string(32),
+                'conversations': [str(conversation.id) for conversation in active],
+                'ended': [str(conversation.id) for conversation in ended],
+            })
+
+        # Bulk inserts bypass the incremental rollups
+        rollups.rebuild(User.objects.filter(username__startswith=USERNAME_PREFIX))
+
+        with open(options['output'], 'w') as manifest:
+            json.dump({
+                'session_cookie': settings.SESSION_COOKIE_NAME,
+                'csrf_cookie': settings.CSRF_COOKIE_NAME,
+                'users': users,
+            }, manifest)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users with {options['conversations']} active and "
+            f"{options['history']} ended conversations each; manifest at {options['output']}"
+        ))
+
+    def create_history(self, user, count, messages_per_conversation, rng, vectors):
+        """Ended conversations with embedded messages, so search and query have work to do"""
+        dimensions = embedding_storage.embedding_dimensions()
+
+        def embedding():
+            vector = vectors.standard_normal(dimensions)
+            return embedding_storage.storage_values((vector / np.linalg.norm(vector)).tolist())
+
+        def sentence():
+            return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize() + "."
+
+        now = timezone.now()
+        conversations = Conversation.objects.bulk_create([
+            Conversation(
+                title=f"Ended {n}", created_by=user, participants=[user.username],
+                status=Conversation.STATUS_ENDED, end_ts=now, summary=sentence(),
+                metadata={'analysis_complete': True}, **embedding()
+            )
+            for n in range(count)
+        ])
+        messages = []
+        for conversation in conversations:
+            for n in range(messages_per_conversation):
+                messages.append(Message(
+                    conversation=conversation,
+                    sender=Message.SENDER_USER if n % 2 == 0 else Message.SENDER_AI,
+                    content=sentence(),
+                    **embedding()
+                ))
+        Message.objects.bulk_create(messages, batch_size=1000)
+        # auto_now_add stamps a whole batch alike; spread messages out so
+        # chronological ordering and neighbour windows behave as in real use
+        for i, msg in enumerate(messages):
+            msg.timestamp = now - timedelta(seconds=messages_per_conversation - i % messages_per_conversation)
+        Message.objects.bulk_update(messages, ['timestamp'], batch_size=1000)
+        return conversations
@@ -0,0 +1,109 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:05
+
+from django.conf import settings
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+from pgvector.django import VectorExtension
+import uuid
+from ai_module.embeddings import binary_enabled, embedding_bits_field, embedding_field, embedding_indexes
+
+# The embedding columns and their HNSW indexes are built with the same
+# helpers as the models, so the vector type (vector or halfvec), its
+# dimensions, whether the bit copy exists and which index is built follow
+# the EMBEDDING_* settings in effect when this migration is applied.
+# halfvec, bit and bit_hamming_ops need pgvector 0.7 or later; the defaults
+# (float32, no binary quantization) work with older versions. Changing
+# these settings on an existing database needs a hand-written migration
+# that alters the columns, rebuilds the indexes and re-embeds.
+
+
+def embedding_columns():
+    columns = [('embedding', embedding_field(blank=True, null=True))]
+    if binary_enabled():
+        columns.append(('embedding_bits', embedding_bits_field(blank=True, null=True)))
+    return columns
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        VectorExtension(),
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.TextField(blank=True)),
+                ('participants', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=100), default=list, size=None)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('ended', 'Ended')], default='active', max_length=10)),
+                ('start_ts', models.DateTimeField(auto_now_add=True)),
+                ('end_ts', models.DateTimeField(blank=True, null=True)),
+                ('summary', models.TextField(blank=True)),
+                ('metadata', models.JSONField(default=dict)),
+                *embedding_columns(),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-start_ts'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AnalysisJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('job_type', models.CharField(choices=[('summary', 'Summary'), ('sentiment', 'Sentiment'), ('keypoints', 'Key Points'), ('embedding', 'Embedding')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('result', models.JSONField(default=dict)),
+                ('error_message', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='chat.conversation')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Message',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('sender', models.CharField(choices=[('user', 'User'), ('ai', 'AI'), ('system', 'System')], max_length=10)),
+                ('content', models.TextField()),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('tokens', models.IntegerField(blank=True, null=True)),
+                ('metadata', models.JSONField(default=dict)),
+                *embedding_columns(),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chat.conversation')),
+            ],
+            options={
+                'ordering': ['timestamp'],
+                'indexes': [models.Index(fields=['conversation', 'timestamp'], name='chat_messag_convers_cd68de_idx'), *embedding_indexes('message')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['start_ts', 'status'], name='chat_conver_start_t_5fca7f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['created_by', 'status'], name='chat_conver_created_65e7c0_idx'),
+        ),
+        *[
+            migrations.AddIndex(model_name='conversation', index=index)
+            for index in embedding_indexes('conversation')
+        ],
+        migrations.AddIndex(
+            model_name='analysisjob',
+            index=models.Index(fields=['conversation', 'job_type'], name='chat_analys_convers_ddc631_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analysisjob',
+            index=models.Index(fields=['status', 'created_at'], name='chat_analys_status_8a2b81_idx'),
+        ),
+    ]
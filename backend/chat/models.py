@@ -2,7 +2,7 @@ import uuid
 from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import ArrayField
-from pgvector.django import VectorField
+from ai_module.embeddings import binary_enabled, embedding_bits_field, embedding_field, embedding_indexes
 
 class Conversation(models.Model):
     STATUS_ACTIVE = 'active'
@@ -20,7 +20,9 @@ class Conversation(models.Model):
     end_ts = models.DateTimeField(null=True, blank=True)
     summary = models.TextField(blank=True)
     metadata = models.JSONField(default=dict)
-    embedding = VectorField(dimensions=1536, blank=True, null=True)
+    embedding = embedding_field(blank=True, null=True)
+    if binary_enabled():
+        embedding_bits = embedding_bits_field(blank=True, null=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -29,6 +31,7 @@ class Conversation(models.Model):
         indexes = [
             models.Index(fields=['start_ts', 'status']),
             models.Index(fields=['created_by', 'status']),
+            *embedding_indexes('conversation'),
         ]
         ordering = ['-start_ts']
     
@@ -58,11 +61,14 @@ class Message(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     tokens = models.IntegerField(null=True, blank=True)
     metadata = models.JSONField(default=dict)
-    embedding = VectorField(dimensions=1536, blank=True, null=True)
+    embedding = embedding_field(blank=True, null=True)
+    if binary_enabled():
+        embedding_bits = embedding_bits_field(blank=True, null=True)
     
     class Meta:
         indexes = [
             models.Index(fields=['conversation', 'timestamp']),
+            *embedding_indexes('message'),
         ]
         ordering = ['timestamp']
     
@@ -0,0 +1,190 @@
+"""
+Wire encodings for the chat WebSocket.
+
+JSON text frames are the default. Clients that offer the chat.msgpack.v1
+subprotocol, or connect with ?format=msgpack when they cannot set one, get
+MessagePack binary frames instead: each message is an array of a small
+type code followed by its fields in a fixed order, so no keys are sent.
+Incoming frames are decoded by their kind, so a MessagePack client may
+still send JSON text.
+
+Codes and field orders are the protocol: add types and append fields,
+never renumber or reorder them. Frames that do not decode to a known
+client message get an `error` message back; the socket stays open.
+"""
+import json
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_SUBPROTOCOL = 'chat.msgpack.v1'
+
+CODES = {
+    'user_message': 1,
+    'typing_indicator': 2,
+    'stop_generation': 3,
+    'resume': 4,
+    'stream_active': 5,
+    'message_ack': 6,
+    'chat_message': 7,
+    'llm_token': 8,
+    'llm_done': 9,
+    'resume_failed': 10,
+    'resume_reset': 11,
+    'error': 12,
+}
+TYPES = {code: name for name, code in CODES.items()}
+
+# Fields following the code, for messages from the client
+CLIENT_FIELDS = {
+    'user_message': ('temp_id', 'content', 'metadata'),
+    'typing_indicator': ('is_typing',),
+    'stop_generation': ('message_id',),
+    'resume': ('message_id', 'last_seq'),
+}
+
+# Fields following the code, for messages to the client
+SERVER_FIELDS = {
+    'stream_active': ('message_id',),
+    'message_ack': ('temp_id', 'message_id', 'timestamp'),
+    'chat_message': ('message_id', 'sender', 'content', 'timestamp'),
+    'llm_token': ('message_id', 'seq', 'token'),
+    'llm_done': ('message_id', 'seq', 'text', 'truncated'),
+    'resume_failed': ('message_id',),
+    'resume_reset': ('message_id',),
+    'typing_indicator': ('user_id', 'is_typing'),
+    'error': ('error',),
+}
+
+
+class ProtocolError(ValueError):
+    """A client frame that is not a valid message"""
+
+
+def _id(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    raise ProtocolError("Expected an id")
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    raise ProtocolError("Expected a string")
+
+
+def _mapping(value):
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise ProtocolError("Expected an object")
+    try:
+        # Stored as JSON; MessagePack can carry bytes that JSON cannot
+        json.dumps(value, allow_nan=False)
+    except (TypeError, ValueError):
+        raise ProtocolError("Expected a JSON object")
+    return value
+
+
+def _flag(value):
+    # 0 and 1 for clients without a boolean type; "false" is not false
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    raise ProtocolError("Expected a boolean")
+
+
+def _seq(value):
+    # A bad sequence number replays the whole reply rather than failing
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+# Type of each client field; values are coerced or rejected on decode
+FIELD_TYPES = {
+    'temp_id': _id,
+    'content': _text,
+    'metadata': _mapping,
+    'is_typing': _flag,
+    'message_id': _id,
+    'last_seq': _seq,
+}
+
+
+class JsonCodec:
+    name = 'json'
+    binary = False
+
+    def encode(self, message: Dict[str, Any]) -> str:
+        return json.dumps(message)
+
+
+class MsgpackCodec:
+    name = 'msgpack'
+    binary = True
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        kind = message['type']
+        return msgpack.packb([CODES[kind], *(message.get(field) for field in SERVER_FIELDS[kind])])
+
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec()
+
+
+def negotiate(scope) -> Tuple[Any, Optional[str]]:
+    """Codec for a connection, and the subprotocol to accept it with"""
+    if msgpack is not None:
+        if MSGPACK_SUBPROTOCOL in scope.get('subprotocols', ()):
+            return MSGPACK, MSGPACK_SUBPROTOCOL
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        if query.get('format') == ['msgpack']:
+            return MSGPACK, None
+    return JSON, None
+
+
+def decode(text_data: str = None, bytes_data: bytes = None) -> Dict[str, Any]:
+    """
+    A client message from a JSON text frame or a MessagePack binary frame,
+    with only the fields of its type, coerced to their types. Raises
+    ProtocolError for anything else.
+    """
+    if text_data is not None:
+        try:
+            data = json.loads(text_data)
+        except ValueError:
+            raise ProtocolError("Invalid JSON")
+        if not isinstance(data, dict):
+            raise ProtocolError("Expected an object")
+        kind = data.get('type')
+        if not isinstance(kind, str):
+            kind = None
+    else:
+        if msgpack is None:
+            raise ProtocolError("Binary frames need msgpack installed")
+        try:
+            frame = msgpack.unpackb(bytes_data)
+        except Exception:
+            raise ProtocolError("Invalid MessagePack")
+        if not isinstance(frame, list) or not frame:
+            raise ProtocolError("Expected an array")
+        code, *values = frame
+        kind = TYPES.get(code) if isinstance(code, int) else None
+        data = dict(zip(CLIENT_FIELDS.get(kind, ()), values))
+    if kind not in CLIENT_FIELDS:
+        raise ProtocolError("Unknown message type")
+    return {
+        'type': kind,
+        **{field: FIELD_TYPES[field](data[field]) for field in CLIENT_FIELDS[kind] if field in data}
+    }
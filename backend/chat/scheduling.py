@@ -0,0 +1,143 @@
+import time
+from typing import Dict, Iterable, List
+import redis
+from django.conf import settings
+
+LANE_INTERACTIVE = 'interactive'
+LANE_BACKFILL = 'backfill'
+# Lanes in the order they are drained
+LANES = (LANE_INTERACTIVE, LANE_BACKFILL)
+
+# Move up to ARGV[1] of the oldest queued ids into the lane's processing set,
+# scored by their lease deadline ARGV[2], so a worker that dies mid-analysis
+# leaves them to be requeued instead of losing them
+POP_SCRIPT = """
+local popped = redis.call('zpopmin', KEYS[1], ARGV[1])
+local ids = {}
+for i = 1, #popped, 2 do
+    redis.call('zadd', KEYS[2], ARGV[2], popped[i])
+    ids[#ids + 1] = popped[i]
+end
+return ids
+"""
+
+# Add ids ARGV[2..] to the queue KEYS[1] scored ARGV[1], skipping any that
+# are already in one of KEYS[2..] (every lane and processing set), so an id
+# is waiting or leased at most once
+ENQUEUE_SCRIPT = """
+local added = 0
+for i = 2, #ARGV do
+    local queued = false
+    for k = 2, #KEYS do
+        if redis.call('zscore', KEYS[k], ARGV[i]) then
+            queued = true
+            break
+        end
+    end
+    if not queued then
+        redis.call('zadd', KEYS[1], ARGV[1], ARGV[i])
+        added = added + 1
+    end
+end
+return added
+"""
+
+# Put ids whose lease expired before ARGV[1] back on the queue, scored ARGV[2]
+REQUEUE_SCRIPT = """
+local expired = redis.call('zrangebyscore', KEYS[2], '-inf', ARGV[1])
+for _, id in ipairs(expired) do
+    redis.call('zrem', KEYS[2], id)
+    redis.call('zadd', KEYS[1], 'NX', ARGV[2], id)
+end
+return #expired
+"""
+
+
+class AnalysisQueue:
+    """
+    Conversations waiting for analysis, one Redis sorted set per lane scored
+    by enqueue time. Draining takes the oldest interactive conversations first
+    and fills any remaining room in the group from the backfill lane.
+
+    Popped conversations are leased, not removed: they move to the lane's
+    processing set until the worker acks them after the analysis commits.
+    Leases that run past ANALYSIS_LEASE_TIMEOUT (the worker died or hung)
+    are put back on the queue by `requeue_expired`.
+
+    Enqueueing a conversation that is already waiting or leased is a no-op.
+    That state lives only in the queue and processing sets, so a lease that
+    expires with its worker frees the conversation along with it.
+    """
+
+    def __init__(self, client: redis.Redis = None):
+        self.client = client or redis.Redis.from_url(settings.REDIS_URL)
+        self._enqueue = self.client.register_script(ENQUEUE_SCRIPT)
+        self._pop = self.client.register_script(POP_SCRIPT)
+        self._requeue = self.client.register_script(REQUEUE_SCRIPT)
+
+    def _key(self, lane: str) -> str:
+        return f"analysis:queue:{lane}"
+
+    def _processing_key(self, lane: str) -> str:
+        return f"analysis:processing:{lane}"
+
+    def enqueue(self, conversation_ids: Iterable[str], lane: str = LANE_INTERACTIVE) -> int:
+        """Queue conversations; ones already waiting or being analysed are skipped"""
+        conversation_ids = list(dict.fromkeys(str(conversation_id) for conversation_id in conversation_ids))
+        if not conversation_ids:
+            return 0
+        keys = [self._key(lane)] + [self._key(other) for other in LANES] + [
+            self._processing_key(other) for other in LANES
+        ]
+        return self._enqueue(keys=keys, args=[time.time(), *conversation_ids])
+
+    def pop(self, count: int) -> List[str]:
+        """Atomically lease up to `count` conversation ids, highest priority first"""
+        deadline = time.time() + settings.ANALYSIS_LEASE_TIMEOUT
+        popped = []
+        for lane in LANES:
+            if len(popped) >= count:
+                break
+            popped.extend(
+                member.decode() for member in self._pop(
+                    keys=[self._key(lane), self._processing_key(lane)], args=[count - len(popped), deadline]
+                )
+            )
+        return popped
+
+    def extend(self, conversation_ids: Iterable[str]) -> None:
+        """Renew the leases of conversations that are still being analysed"""
+        deadline = time.time() + settings.ANALYSIS_LEASE_TIMEOUT
+        members = {str(conversation_id): deadline for conversation_id in conversation_ids}
+        if members:
+            with self.client.pipeline(transaction=False) as pipe:
+                for lane in LANES:
+                    pipe.zadd(self._processing_key(lane), members, xx=True)
+                pipe.execute()
+
+    def ack(self, conversation_ids: Iterable[str]) -> None:
+        """End the leases of analysed conversations and let them be queued again"""
+        conversation_ids = [str(conversation_id) for conversation_id in conversation_ids]
+        if conversation_ids:
+            with self.client.pipeline(transaction=False) as pipe:
+                for lane in LANES:
+                    pipe.zrem(self._processing_key(lane), *conversation_ids)
+                pipe.execute()
+
+    def requeue_expired(self) -> int:
+        """Put conversations whose lease ran out back on their lane"""
+        now = time.time()
+        return sum(
+            self._requeue(keys=[self._key(lane), self._processing_key(lane)], args=[now, now])
+            for lane in LANES
+        )
+
+    def sizes(self) -> Dict[str, int]:
+        return {lane: self.client.zcard(self._key(lane)) for lane in LANES}
+
+    def leased(self) -> int:
+        return sum(self.client.zcard(self._processing_key(lane)) for lane in LANES)
+
+
+def enqueue_analysis(conversation_ids: Iterable[str], lane: str = LANE_INTERACTIVE) -> int:
+    return AnalysisQueue().enqueue(conversation_ids, lane)
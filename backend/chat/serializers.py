@@ -16,7 +16,9 @@ class ConversationSerializer(serializers.ModelSerializer):
             'id', 'title', 'participants', 'status', 'start_ts', 'end_ts',
             'summary', 'metadata', 'duration', 'messages', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'start_ts', 'created_at', 'updated_at']
+        # Conversations end through the `end` action only, which keeps the
+        # analytics rollups in step
+        read_only_fields = ['id', 'status', 'start_ts', 'end_ts', 'created_at', 'updated_at']
 
 class ConversationListSerializer(serializers.ModelSerializer):
     message_count = serializers.SerializerMethodField()
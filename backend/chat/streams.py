@@ -0,0 +1,122 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+from django.conf import settings
+from redis import asyncio as aioredis
+
+EVENT_START = 'start'
+EVENT_TOKEN = 'token'
+EVENT_DONE = 'done'
+
+_clients = {}
+
+
+def conversation_group(conversation_id) -> str:
+    """Channel layer group for the sockets of one conversation"""
+    return f"chat.{conversation_id}"
+
+
+def get_client() -> aioredis.Redis:
+    """Shared Redis client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = aioredis.Redis.from_url(settings.REDIS_URL)
+    return client
+
+
+def _decode(fields: Dict[bytes, bytes]) -> Dict[str, str]:
+    return {key.decode(): value.decode() for key, value in fields.items()}
+
+
+class ReplayBuffer:
+    """
+    Mirrors each AI reply into a bounded, expiring Redis stream so clients
+    that reconnect mid-reply can replay the tokens they missed before
+    following the live frames. Entries carry the same sequence numbers as
+    the socket frames.
+    """
+
+    def __init__(self, conversation_id: str, client: aioredis.Redis = None):
+        self.conversation_id = conversation_id
+        self.client = client or get_client()
+
+    def _key(self, message_id: str) -> str:
+        # Scoping by conversation means a reply can only be resumed from the
+        # conversation that produced it
+        return f"chat:reply:{self.conversation_id}:{message_id}"
+
+    def _active_key(self) -> str:
+        return f"chat:active:{self.conversation_id}"
+
+    def _listeners_key(self) -> str:
+        return f"chat:listeners:{self.conversation_id}"
+
+    def _flag_key(self, message_id: str, flag: str) -> str:
+        return f"{self._key(message_id)}:{flag}"
+
+    async def start(self, message_id: str):
+        ttl = settings.STREAM_REPLAY_TTL
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.xadd(self._key(message_id), {'event': EVENT_START, 'seq': 0})
+            pipe.expire(self._key(message_id), ttl)
+            pipe.set(self._active_key(), message_id, ex=ttl)
+            await pipe.execute()
+
+    async def append(self, message_id: str, seq: int, token: str, count: int = 1,
+                     check_stop: bool = False) -> bool:
+        """
+        Add `count` tokens ending at `seq`; with `check_stop`, returns whether
+        a stop was requested for the reply
+        """
+        fields = {'event': EVENT_TOKEN, 'seq': seq, 'count': count, 'token': token}
+        maxlen = settings.STREAM_REPLAY_MAXLEN
+        if not check_stop:
+            await self.client.xadd(self._key(message_id), fields, maxlen=maxlen, approximate=True)
+            return False
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.xadd(self._key(message_id), fields, maxlen=maxlen, approximate=True)
+            pipe.exists(self._flag_key(message_id, 'stop'))
+            _, stop = await pipe.execute()
+        return bool(stop)
+
+    async def finish(self, message_id: str, seq: int, truncated: bool):
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.xadd(self._key(message_id), {'event': EVENT_DONE, 'seq': seq, 'truncated': int(truncated)})
+            pipe.expire(self._key(message_id), settings.STREAM_REPLAY_TTL)
+            pipe.delete(self._active_key())
+            await pipe.execute()
+
+    async def active_reply(self) -> Optional[str]:
+        message_id = await self.client.get(self._active_key())
+        return message_id.decode() if message_id else None
+
+    async def mark(self, message_id: str, flag: str):
+        """Set a short-lived flag (`stop`) on a reply"""
+        await self.client.set(self._flag_key(message_id, flag), 1, ex=settings.STREAM_REPLAY_TTL)
+
+    async def read(self, message_id: str) -> List[Dict[str, str]]:
+        """Everything buffered for a reply"""
+        entries = await self.client.xrange(self._key(message_id))
+        return [_decode(fields) for _, fields in entries]
+
+    async def join(self, channel_name: str):
+        """
+        Record a connected socket for the conversation. Sockets refresh this
+        every STREAM_PRESENCE_INTERVAL; ones not seen for STREAM_PRESENCE_TTL
+        (their worker died without disconnecting them) stop counting.
+        """
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(self._listeners_key(), {channel_name: time.time()})
+            pipe.expire(self._listeners_key(), settings.STREAM_PRESENCE_TTL)
+            await pipe.execute()
+
+    async def leave(self, channel_name: str):
+        await self.client.zrem(self._listeners_key(), channel_name)
+
+    async def listeners(self) -> int:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self._listeners_key(), '-inf', time.time() - settings.STREAM_PRESENCE_TTL)
+            pipe.zcard(self._listeners_key())
+            _, count = await pipe.execute()
+        return count
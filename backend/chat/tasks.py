@@ -1,38 +1,30 @@
 from celery import shared_task
+from django.conf import settings
 from .models import Conversation, AnalysisJob
+from .scheduling import AnalysisQueue, LANE_BACKFILL
 from ai_module.services import AnalysisService
+from analytics import rollups
+from core import metrics
 
 @shared_task
 def analyze_conversation(conversation_id):
     """Background task to analyze conversation after it ends"""
+    queue = AnalysisQueue()
+    # The task may have waited in the broker; keep the lease from expiring
+    # while it runs
+    queue.extend([conversation_id])
     try:
-        conversation = Conversation.objects.get(id=conversation_id)
-        analysis_service = AnalysisService()
-        
-        # Run various analysis tasks
-        summary = analysis_service.generate_summary(conversation)
-        key_points = analysis_service.extract_key_points(conversation)
-        sentiment = analysis_service.analyze_sentiment(conversation)
-        embeddings = analysis_service.generate_embeddings(conversation)
-        
-        # Update conversation with results
-        conversation.summary = summary
-        conversation.metadata.update({
-            'key_points': key_points,
-            'sentiment': sentiment,
-            'analysis_complete': True
-        })
-        conversation.embedding = embeddings.get('conversation_embedding')
-        conversation.save()
-        
-        return {
-            'conversation_id': str(conversation_id),
-            'summary_generated': bool(summary),
-            'key_points_count': len(key_points),
-            'sentiment_score': sentiment.get('score')
-        }
+        conversation = Conversation.objects.prefetch_related('messages').get(id=conversation_id)
+        with metrics.timed(metrics.ANALYSIS_STAGE_SECONDS, 'total', span='analysis.conversation'):
+            results = AnalysisService().analyze_batch([conversation])
+        rollups.refresh_conversations([conversation])
+        metrics.ANALYSIS_CONVERSATIONS.labels('analyzed').inc()
+        finish(queue, [conversation_id], results)
+        return results[0]
         
     except Exception as e:
+        metrics.ANALYSIS_CONVERSATIONS.labels('failed').inc()
+        queue.ack([conversation_id])
         # Log error and create failed job record
         AnalysisJob.objects.create(
             conversation_id=conversation_id,
@@ -40,4 +32,56 @@ def analyze_conversation(conversation_id):
             status=AnalysisJob.STATUS_FAILED,
             error_message=str(e)
         )
-        raise e
\ No newline at end of file
+        raise e
+
+@shared_task
+def drain_analysis_queue():
+    """Periodic task to analyze queued conversations in groups"""
+    queue = AnalysisQueue()
+    requeued = queue.requeue_expired()
+    analyzed = []
+    for _ in range(settings.ANALYSIS_MAX_GROUPS_PER_RUN):
+        conversation_ids = queue.pop(settings.ANALYSIS_BATCH_SIZE)
+        if not conversation_ids:
+            break
+        analyzed.extend(analyze_conversation_group(conversation_ids))
+    return {'analyzed': len(analyzed), 'requeued': requeued, 'queued': queue.sizes(), 'leased': queue.leased()}
+
+def finish(queue, conversation_ids, results):
+    """
+    Ack analysed conversations once their results are committed, then queue
+    again (on the backfill lane) the ones with embeddings still missing
+    """
+    queue.ack(conversation_ids)
+    retry = [
+        result['conversation_id'] for result in results
+        if result['embeddings_missing'] and result['embedding_attempts'] < settings.ANALYSIS_EMBEDDING_RETRIES
+    ]
+    if retry:
+        queue.enqueue(retry, LANE_BACKFILL)
+
+def analyze_conversation_group(conversation_ids):
+    conversations = list(
+        Conversation.objects.filter(id__in=conversation_ids).prefetch_related('messages')
+    )
+    queue = AnalysisQueue()
+    # Ids whose conversation was deleted meanwhile
+    queue.ack(set(conversation_ids) - {str(conversation.id) for conversation in conversations})
+    if not conversations:
+        return []
+    try:
+        with metrics.timed(metrics.ANALYSIS_STAGE_SECONDS, 'total', span='analysis.batch',
+                           conversations=len(conversations)):
+            results = AnalysisService().analyze_batch(conversations)
+        rollups.refresh_conversations(conversations)
+        metrics.ANALYSIS_CONVERSATIONS.labels('analyzed').inc(len(results))
+        finish(queue, [str(conversation.id) for conversation in conversations], results)
+        return results
+    except Exception:
+        metrics.ANALYSIS_CONVERSATIONS.labels('retried').inc(len(conversations))
+        # Retry one conversation per task so a single bad conversation
+        # fails on its own and gets its failed job record; the leases stay
+        # until each task acks its conversation
+        for conversation in conversations:
+            analyze_conversation.delay(str(conversation.id))
+        return []
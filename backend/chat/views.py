@@ -2,10 +2,16 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters import rest_framework as filters
+from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
+from analytics import rollups
+from core.singleflight import SingleFlight
 from .models import Conversation, Message
 from .serializers import ConversationSerializer, ConversationListSerializer, MessageSerializer
-from .tasks import analyze_conversation
+from .scheduling import enqueue_analysis
+
+query_flight = SingleFlight('conversation_query')
 
 class ConversationFilter(filters.FilterSet):
     search = filters.CharFilter(method='filter_search')
@@ -30,9 +36,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
     filterset_class = ConversationFilter
     
     def get_queryset(self):
-        return Message.objects.filter(
-            conversation__created_by=self.request.user
-        ).select_related('conversation')
+        return Conversation.objects.filter(created_by=self.request.user)
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -40,17 +44,30 @@ class ConversationViewSet(viewsets.ModelViewSet):
         return ConversationSerializer
     
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        with transaction.atomic():
+            conversation = serializer.save(created_by=self.request.user)
+            rollups.record_conversation_started(conversation)
+    
+    def perform_update(self, serializer):
+        conversation = serializer.save()
+        rollups.refresh_conversations([conversation])
+    
+    def perform_destroy(self, instance):
+        rollups.delete_conversation(instance)
     
     @action(detail=True, methods=['post'])
     def end(self, request, pk=None):
         conversation = self.get_object()
-        if conversation.status == Conversation.STATUS_ACTIVE:
-            conversation.status = Conversation.STATUS_ENDED
-            conversation.save()
-            
-            # Trigger analysis tasks
-            analyze_conversation.delay(str(conversation.id))
+        # Conditional update: of concurrent requests (a double click) only
+        # one sees the conversation active, ends it and queues its analysis
+        now = timezone.now()
+        ended = Conversation.objects.filter(
+            pk=conversation.pk, status=Conversation.STATUS_ACTIVE
+        ).update(status=Conversation.STATUS_ENDED, end_ts=now, updated_at=now)
+        if ended:
+            # Queue for the next batched analysis run
+            enqueue_analysis([str(conversation.id)])
+            rollups.refresh_ended([(conversation.created_by_id, rollups.day_of(now))])
             
             return Response({'status': 'conversation ended'})
         return Response(
@@ -73,7 +90,10 @@ class ConversationViewSet(viewsets.ModelViewSet):
         from ai_module.services import ConversationQueryService
         
         try:
-            result = ConversationQueryService().query_conversation(conversation, user_query)
+            result = query_flight.do(
+                query_flight.key(conversation.id, user_query),
+                lambda: ConversationQueryService().query_conversation(conversation, user_query)
+            )
             return Response(result)
         except Exception as e:
             return Response(
@@ -81,7 +101,9 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(viewsets.ReadOnlyModelViewSet):
+    # Messages are written over the WebSocket, which keeps the analytics
+    # rollups in step; the API only reads them
     serializer_class = MessageSerializer
     
     def get_queryset(self):
@@ -1,16 +1,24 @@
 import os
 from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+# Sets Django up; must run before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
+from core.lifespan import Lifespan, preload
 import chat.routing
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+preload()
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             chat.routing.websocket_urlpatterns
         )
     ),
-})
\ No newline at end of file
+    "lifespan": Lifespan(),
+})
@@ -0,0 +1,67 @@
+"""
+Channel layers that spread groups and channels over several Redis hosts.
+
+channels_redis already accepts a list of hosts, but it places keys with a
+range split of a 12-bit CRC, so adding a host moves about half of all
+groups to a different instance. Both layers here place keys with jump
+consistent hashing instead: growing from N to N+1 hosts moves only 1/(N+1)
+of them, and with a single host they behave exactly like the stock layers.
+
+Every process sharing a deployment must use the same layer class and the
+same ordered host list, otherwise publishers and subscribers disagree about
+where a group lives.
+"""
+import asyncio
+import hashlib
+from channels_redis.core import RedisChannelLayer
+from channels_redis.pubsub import RedisPubSubChannelLayer, RedisPubSubLoopLayer
+from channels_redis.utils import _wrap_close
+
+
+def jump_hash(value, buckets: int) -> int:
+    """Lamping & Veach jump consistent hash of `value` into [0, buckets)"""
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    key = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    """
+    List-based layer with groups and channels placed by jump hash.
+
+    A group's membership lives on the host its name hashes to; group_send
+    then delivers to each member on the host of that member's process, so a
+    conversation's fan-out is spread over the hosts its sockets landed on.
+    """
+
+    def consistent_hash(self, value):
+        return jump_hash(value, self.ring_size)
+
+
+class ShardedRedisPubSubLoopLayer(RedisPubSubLoopLayer):
+    def _get_shard(self, channel_or_group_name):
+        return self._shards[jump_hash(channel_or_group_name, len(self._shards))]
+
+
+class ShardedRedisPubSubChannelLayer(RedisPubSubChannelLayer):
+    """
+    Pub/sub layer with each group published on the single host its name
+    hashes to. Delivery is at-most-once: frames sent while a socket is
+    reconnecting are lost, which the reply replay buffer covers for tokens.
+    """
+
+    def _get_layer(self):
+        loop = asyncio.get_running_loop()
+        try:
+            layer = self._layers[loop]
+        except KeyError:
+            layer = ShardedRedisPubSubLoopLayer(*self._args, **self._kwargs, channel_layer=self)
+            self._layers[loop] = layer
+            _wrap_close(self, loop)
+        return layer
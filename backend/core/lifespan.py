@@ -0,0 +1,97 @@
+"""
+Worker startup and shutdown for the ASGI server.
+
+`preload()` runs when core.asgi is imported. Under gunicorn with
+preload_app that is once, in the master, so the URLconf, every view and
+the AI SDK are loaded before forking and their memory is shared by the
+workers. `Lifespan` then runs in each worker: on startup, before the
+server accepts traffic, it checks the database and opens the connections
+a worker cannot inherit (Redis, channel layer, provider client); on
+shutdown it lets in-flight AI replies finish for up to
+STREAM_DRAIN_TIMEOUT seconds.
+"""
+import asyncio
+import logging
+import time
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def preload():
+    started = time.perf_counter()
+    # Imports every view and compiles the URL patterns the first request
+    # would otherwise pay for
+    get_resolver().reverse_dict
+    from ai_module.clients import import_sdk
+    import_sdk()
+    logger.info("Preloaded application in %.2fs", time.perf_counter() - started)
+
+
+@database_sync_to_async
+def _warm_database():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+async def _warm_redis():
+    from chat.streams import get_client
+    await get_client().ping()
+
+
+async def _warm_channel_layer():
+    layer = get_channel_layer()
+    # RedisChannelLayer pools are per event loop and filled lazily; the
+    # pub/sub layer connects as groups are joined
+    if hasattr(layer, 'connection'):
+        await asyncio.gather(*(layer.connection(index).ping() for index in range(layer.ring_size)))
+
+
+async def _warm_provider():
+    from ai_module.clients import openai_client
+    openai_client()
+
+
+WARMUPS = {
+    'database': _warm_database,
+    'redis': _warm_redis,
+    'channel_layer': _warm_channel_layer,
+    'provider': _warm_provider,
+}
+
+
+async def warm_up():
+    started = time.perf_counter()
+    results = await asyncio.gather(*(warm() for warm in WARMUPS.values()), return_exceptions=True)
+    for name, result in zip(WARMUPS, results):
+        if isinstance(result, Exception):
+            # Warming is an optimisation; a dependency that is down now is
+            # reported and retried by the first request that needs it
+            logger.warning("Warm-up of %s failed: %r", name, result)
+    logger.info("Warmed up in %.2fs", time.perf_counter() - started)
+
+
+async def drain():
+    from chat.consumers import drain_generations
+    started = time.perf_counter()
+    await drain_generations(settings.STREAM_DRAIN_TIMEOUT)
+    logger.info("Drained in %.2fs", time.perf_counter() - started)
+
+
+class Lifespan:
+    """ASGI lifespan protocol handler"""
+
+    async def __call__(self, scope, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await warm_up()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await drain()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
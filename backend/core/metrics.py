@@ -0,0 +1,132 @@
+"""
+Prometheus metrics and optional OpenTelemetry spans.
+
+Metrics are collected when METRICS_ENABLED is set and prometheus_client is
+installed, and exposed at /metrics to scrapers that send
+`Authorization: Bearer $METRICS_TOKEN`; without a token configured the
+endpoint is off. Spans are emitted when
+METRICS_OTEL_ENABLED is set and opentelemetry-api is installed; exporting
+them is left to the deployment's OpenTelemetry SDK setup. With both off,
+every metric below is a shared no-op and `timed` returns a null context,
+so instrumented code pays next to nothing.
+
+Under several worker processes set PROMETHEUS_MULTIPROC_DIR so the
+endpoint aggregates every process, Celery workers included.
+"""
+import hmac
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+ENABLED = settings.METRICS_ENABLED and prometheus_client is not None
+TRACER = trace.get_tracer('chat') if settings.METRICS_OTEL_ENABLED and trace is not None else None
+
+# Few buckets keep each observation cheap
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+
+_NULL = nullcontext()
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    if not ENABLED:
+        return _NoopMetric()
+    return prometheus_client.Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+def counter(name, documentation, labelnames=()):
+    if not ENABLED:
+        return _NoopMetric()
+    return prometheus_client.Counter(name, documentation, labelnames)
+
+
+CHAT_TURN_SECONDS = histogram(
+    'chat_turn_phase_seconds', 'Duration of each phase of a chat turn', ['phase']
+)
+WEBSOCKET_SEND_SECONDS = histogram(
+    'chat_websocket_send_seconds', 'Time to hand a frame to the WebSocket, including backpressure'
+)
+LLM_REQUEST_SECONDS = histogram(
+    'llm_request_seconds', 'Provider request duration', ['model', 'operation']
+)
+LLM_TTFT_SECONDS = histogram(
+    'llm_time_to_first_token_seconds', 'Time from request to first streamed token', ['model']
+)
+LLM_TOKENS_PER_SECOND = histogram(
+    'llm_tokens_per_second', 'Streamed tokens per second after the first token', ['model'],
+    buckets=RATE_BUCKETS
+)
+LLM_ERRORS = counter(
+    'llm_errors_total', 'Failed provider requests', ['model', 'operation', 'error']
+)
+SEARCH_SECONDS = histogram(
+    'semantic_search_seconds', 'Semantic search duration by stage', ['stage']
+)
+ANALYSIS_STAGE_SECONDS = histogram(
+    'analysis_stage_seconds', 'Conversation analysis duration by stage', ['stage']
+)
+ANALYSIS_CONVERSATIONS = counter(
+    'analysis_conversations_total', 'Conversations analysed', ['outcome']
+)
+
+
+@contextmanager
+def _timed(metric, span, attributes):
+    context = TRACER.start_as_current_span(span, attributes=attributes) if TRACER and span else _NULL
+    start = time.perf_counter()
+    with context:
+        try:
+            yield
+        finally:
+            metric.observe(time.perf_counter() - start)
+
+
+def timed(metric, *labels, span=None, **attributes):
+    """
+    Observe the duration of a block on `metric` (with `labels`), inside an
+    OpenTelemetry span named `span` when tracing is on
+    """
+    if not ENABLED and not (TRACER and span):
+        return _NULL
+    if labels:
+        metric = metric.labels(*labels)
+    return _timed(metric, span, attributes)
+
+
+def metrics_view(request):
+    """Prometheus exposition endpoint"""
+    # Traffic per model, error rates and queue sizes are not public
+    token = settings.METRICS_TOKEN
+    if not ENABLED or not token:
+        return HttpResponseNotFound()
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    registry = prometheus_client.REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(prometheus_client.generate_latest(registry), content_type=prometheus_client.CONTENT_TYPE_LATEST)
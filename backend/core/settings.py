@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     # Local apps
     'chat',
     'ai_module',
+    'analytics',
 ]
 
 MIDDLEWARE = [
@@ -78,18 +79,83 @@ DATABASES = {
 # Redis & Channels
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 
+# Channel layer hosts, comma separated. Groups are spread across them by
+# consistent hashing; every node must list the same hosts in the same order.
+REDIS_CHANNEL_HOSTS = [
+    host.strip() for host in os.getenv('REDIS_CHANNEL_HOSTS', REDIS_URL).split(',') if host.strip()
+]
+CHANNEL_LAYER_BACKENDS = {
+    'core': 'core.channel_layers.ShardedRedisChannelLayer',
+    'pubsub': 'core.channel_layers.ShardedRedisPubSubChannelLayer',
+}
+
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'BACKEND': CHANNEL_LAYER_BACKENDS[os.getenv('CHANNEL_LAYER_BACKEND', 'core')],
         'CONFIG': {
-            "hosts": [REDIS_URL],
+            "hosts": REDIS_CHANNEL_HOSTS,
         },
     },
 }
 
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    },
+}
+
+# Resumable reply streams
+STREAM_REPLAY_MAXLEN = int(os.getenv('STREAM_REPLAY_MAXLEN', '4000'))
+STREAM_REPLAY_TTL = int(os.getenv('STREAM_REPLAY_TTL', '600'))
+STREAM_RESUME_GRACE = float(os.getenv('STREAM_RESUME_GRACE', '15'))
+# Seconds live frames of an active reply are held after connect for the
+# client to send `resume` before they are sent without a replay
+STREAM_RESUME_HOLD = float(os.getenv('STREAM_RESUME_HOLD', '5'))
+STREAM_BATCH_TOKENS = int(os.getenv('STREAM_BATCH_TOKENS', '16'))
+STREAM_BATCH_INTERVAL = float(os.getenv('STREAM_BATCH_INTERVAL', '0.05'))
+TYPING_THROTTLE = float(os.getenv('TYPING_THROTTLE', '3'))
+# Connected sockets refresh their presence every interval; a socket not seen
+# for the TTL (its worker died) no longer keeps a detached reply running
+STREAM_PRESENCE_INTERVAL = float(os.getenv('STREAM_PRESENCE_INTERVAL', '10'))
+STREAM_PRESENCE_TTL = int(os.getenv('STREAM_PRESENCE_TTL', '30'))
+# Seconds a stopping worker lets in-flight replies finish before cutting them off
+STREAM_DRAIN_TIMEOUT = float(os.getenv('STREAM_DRAIN_TIMEOUT', '30'))
+
 # Celery
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
+CELERY_BEAT_SCHEDULE = {
+    'drain-analysis-queue': {
+        'task': 'chat.tasks.drain_analysis_queue',
+        'schedule': float(os.getenv('ANALYSIS_BATCH_INTERVAL', '5')),
+    },
+}
+
+# Batched analysis of ended conversations
+ANALYSIS_BATCH_SIZE = int(os.getenv('ANALYSIS_BATCH_SIZE', '25'))
+ANALYSIS_MAX_GROUPS_PER_RUN = int(os.getenv('ANALYSIS_MAX_GROUPS_PER_RUN', '4'))
+# Seconds a worker may hold popped conversations before they are requeued
+ANALYSIS_LEASE_TIMEOUT = int(os.getenv('ANALYSIS_LEASE_TIMEOUT', '900'))
+# Analyses a conversation gets to fill in embeddings that failed
+ANALYSIS_EMBEDDING_RETRIES = int(os.getenv('ANALYSIS_EMBEDDING_RETRIES', '3'))
+
+# Analytics API: default and longest date range, payload cache and client max-age (seconds)
+ANALYTICS_DEFAULT_DAYS = int(os.getenv('ANALYTICS_DEFAULT_DAYS', '30'))
+ANALYTICS_MAX_DAYS = int(os.getenv('ANALYTICS_MAX_DAYS', '366'))
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', '300'))
+ANALYTICS_MAX_AGE = int(os.getenv('ANALYTICS_MAX_AGE', '30'))
+
+# Request coalescing: concurrent identical searches and queries share one run
+SINGLEFLIGHT_LOCK_TIMEOUT = float(os.getenv('SINGLEFLIGHT_LOCK_TIMEOUT', '60'))
+SINGLEFLIGHT_RESULT_TTL = float(os.getenv('SINGLEFLIGHT_RESULT_TTL', '2'))
+
+# Metrics (Prometheus at /metrics, optional OpenTelemetry spans). /metrics
+# is only served with a METRICS_TOKEN set, to requests bearing it
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_OTEL_ENABLED = os.getenv('METRICS_OTEL_ENABLED', 'False') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
 
 # REST Framework
 REST_FRAMEWORK = {
@@ -116,11 +182,37 @@ CORS_ALLOW_CREDENTIALS = True
 
 # AI Configuration
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# Any OpenAI-compatible endpoint, e.g. benchmarks/fake_openai.py for load tests
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
 AI_MODEL = os.getenv('AI_MODEL', 'gpt-3.5-turbo')
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
 
+# Embedding storage: dimensions below the model's native size are requested
+# Matryoshka-style from text-embedding-3-* models (1536 -> 512 is 3x smaller),
+# float16 stores halfvec (2x smaller) and binary quantization adds a bit(n)
+# copy (32x smaller) used to shortlist candidates before re-ranking
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', '1536'))
+EMBEDDING_PRECISION = os.getenv('EMBEDDING_PRECISION', 'float32')
+EMBEDDING_BINARY_QUANTIZATION = os.getenv('EMBEDDING_BINARY_QUANTIZATION', 'False') == 'True'
+EMBEDDING_RERANK_CANDIDATES = int(os.getenv('EMBEDDING_RERANK_CANDIDATES', '10'))
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '512'))
+
 # Static files
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Rolling summarization
+SUMMARY_CHUNK_SIZE = int(os.getenv('SUMMARY_CHUNK_SIZE', '40'))
+SUMMARY_MERGE_FANOUT = int(os.getenv('SUMMARY_MERGE_FANOUT', '8'))
+SUMMARY_CONCURRENCY = int(os.getenv('SUMMARY_CONCURRENCY', '4'))
+SUMMARY_CACHE_TTL = int(os.getenv('SUMMARY_CACHE_TTL', str(30 * 24 * 3600)))
+
+# Conversation queries
+QUERY_TOP_K = int(os.getenv('QUERY_TOP_K', '6'))
+QUERY_NEIGHBOR_WINDOW = int(os.getenv('QUERY_NEIGHBOR_WINDOW', '1'))
+QUERY_CONTEXT_TOKENS = int(os.getenv('QUERY_CONTEXT_TOKENS', '3000'))
+
+# Local analysis
+KEY_POINTS_LIMIT = int(os.getenv('KEY_POINTS_LIMIT', '8'))
@@ -0,0 +1,109 @@
+"""
+Request coalescing: concurrent identical calls share one execution.
+
+Within a process, callers that arrive while a call with the same key is
+running wait for it and get its result (or its exception). Across
+processes and nodes, the first caller takes a Redis lock and publishes
+its result for SINGLEFLIGHT_RESULT_TTL seconds; the others wait for that
+result instead of repeating the work, and fall back to running it
+themselves if the owner fails or the wait times out.
+"""
+import hashlib
+import json
+import pickle
+import threading
+import time
+import uuid
+from typing import Any, Callable
+import redis
+from django.conf import settings
+
+# Delete the lock only while it still holds our token, so an owner that
+# overran the lock timeout cannot release a successor's lock
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, namespace: str, client: redis.Redis = None, lock_timeout: float = None,
+                 result_ttl: float = None, poll_interval: float = 0.05):
+        self.namespace = namespace
+        self.client = client or redis.Redis.from_url(settings.REDIS_URL)
+        self.lock_timeout = lock_timeout or settings.SINGLEFLIGHT_LOCK_TIMEOUT
+        self.result_ttl = result_ttl or settings.SINGLEFLIGHT_RESULT_TTL
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+
+    def key(self, *parts) -> str:
+        digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return f"singleflight:{self.namespace}:{digest}"
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Result of `fn()`, shared with every concurrent call for `key`"""
+        with self._lock:
+            call = self._calls.get(key)
+            owner = call is None
+            if owner:
+                call = self._calls[key] = _Call()
+        if not owner:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_shared(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _do_shared(self, key: str, fn: Callable[[], Any]) -> Any:
+        lock_key, result_key = f"{key}:lock", f"{key}:result"
+        token = uuid.uuid4().hex
+        try:
+            owner = self.client.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except redis.RedisError:
+            # Coalescing is an optimisation; without Redis just do the work
+            return fn()
+        if owner:
+            try:
+                # Waiters must not pick up a result from an earlier flight
+                self.client.delete(result_key)
+                result = fn()
+                self.client.set(result_key, pickle.dumps(result), px=int(self.result_ttl * 1000))
+                return result
+            finally:
+                self._release(keys=[lock_key], args=[token])
+
+        # Another node is running it; wait for its result while it holds the lock
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            cached = self.client.get(result_key)
+            if cached is not None:
+                return pickle.loads(cached)
+            if not self.client.exists(lock_key):
+                # Finished without a result (it failed) or gave up
+                cached = self.client.get(result_key)
+                if cached is not None:
+                    return pickle.loads(cached)
+                break
+            time.sleep(self.poll_interval)
+        return fn()
@@ -3,6 +3,7 @@ from django.urls import path, include
 from rest_framework import routers
 from chat import views as chat_views
 from django.http import JsonResponse
+from core.metrics import metrics_view
 
 
 router = routers.DefaultRouter()
@@ -17,5 +18,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
     path('api/ai/', include('ai_module.urls')),
+    path('api/analytics/', include('analytics.urls')),
     path('api/auth/', include('rest_framework.urls')),
+    path('metrics', metrics_view),
 ]
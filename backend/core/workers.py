@@ -0,0 +1,39 @@
+"""
+Gunicorn worker for core.asgi with tuned WebSocket compression.
+
+uvicorn negotiates permessage-deflate with zlib's defaults, which keep
+about 256 KB of compressor state per socket (a 32 KB window at memLevel 8)
+for as long as it is open. Chat frames are small and repeat themselves
+within a few frames, so a 4 KB window at memLevel 5 keeps nearly all of
+the saving for about 32 KB per socket; python benchmarks/wire_protocol.py
+compares them. Set WEBSOCKET_DEFLATE=False to turn compression off.
+"""
+import os
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+DEFLATE = os.getenv('WEBSOCKET_DEFLATE', 'True') == 'True'
+DEFLATE_WINDOW_BITS = int(os.getenv('WEBSOCKET_DEFLATE_WINDOW_BITS', '12'))
+DEFLATE_MEM_LEVEL = int(os.getenv('WEBSOCKET_DEFLATE_MEM_LEVEL', '5'))
+
+
+class CompressedWebSocketProtocol(WebSocketProtocol):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.config.ws_per_message_deflate:
+            # Clients that allow it also decompress our frames and compress
+            # theirs with the smaller window
+            self.available_extensions = [ServerPerMessageDeflateFactory(
+                server_max_window_bits=DEFLATE_WINDOW_BITS,
+                client_max_window_bits=DEFLATE_WINDOW_BITS,
+                compress_settings={'memLevel': DEFLATE_MEM_LEVEL},
+            )]
+
+
+class UvicornWorker(BaseUvicornWorker):
+    CONFIG_KWARGS = {
+        **BaseUvicornWorker.CONFIG_KWARGS,
+        'ws': CompressedWebSocketProtocol,
+        'ws_per_message_deflate': DEFLATE,
+    }
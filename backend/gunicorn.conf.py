@@ -0,0 +1,21 @@
+"""
+Production server: gunicorn managing uvicorn workers for core.asgi.
+
+    gunicorn core.asgi:application -c gunicorn.conf.py
+
+Each worker runs its own event loop serving HTTP and WebSockets, so one
+per core is enough. With preload_app the application is imported once in
+the master and shared copy-on-write by the workers (see core.lifespan).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'core.workers.UvicornWorker'
+preload_app = os.getenv('PRELOAD_APP', 'True') == 'True'
+backlog = 2048
+keepalive = 5
+timeout = 60
+# Longer than the stream drain, so a stopping worker is not killed mid-drain
+graceful_timeout = int(float(os.getenv('STREAM_DRAIN_TIMEOUT', '30'))) + 10